@@ -6,6 +6,8 @@ import os
 import secrets
 import re
 import json
+import random
+import threading
 from datetime import datetime
 from functools import wraps
 from dotenv import load_dotenv
@@ -13,6 +15,14 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv()
 
+from fallback_content import library
+from prefetch import ActivityCache, LLMBudget, PrefetchScheduler
+from hedging import HedgedCaller
+from insight_engine import InsightEngine
+import topic_graph
+import deletion
+import retention
+
 # Initialize Gemini AI
 GEMINI_AVAILABLE = False
 genai = None
@@ -43,11 +53,46 @@ app.secret_key = secrets.token_hex(16)
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 
+# Generated activity sets are cached per topic only when prefetching is on
+# (MINDLAB_PREFETCH_TOPICS > 0) or a cache TTL is set, so by default every load
+# gets a freshly generated set. Every Gemini call draws from a global
+# per-minute budget (0 = unlimited).
+PREFETCH_TOPICS = int(os.getenv('MINDLAB_PREFETCH_TOPICS', '0'))
+activity_cache = ActivityCache(max_size=int(os.getenv('MINDLAB_ACTIVITY_CACHE_SIZE', '256')),
+                               ttl=int(os.getenv('MINDLAB_ACTIVITY_CACHE_TTL',
+                                                 '3600' if PREFETCH_TOPICS > 0 else '0')))
+llm_budget = LLMBudget(int(os.getenv('MINDLAB_LLM_CALLS_PER_MINUTE', '0')))
+
+# Topic graph: concepts saved within this many seconds of each other count as one
+# study session; once a topic has at least MINDLAB_GRAPH_MIN_WEIGHT observed next
+# steps, they replace the generated related topics in Pattern Insights
+TOPIC_GRAPH_SESSION_GAP = int(os.getenv('MINDLAB_GRAPH_SESSION_GAP', str(topic_graph.SESSION_GAP)))
+TOPIC_GRAPH_MIN_WEIGHT = int(os.getenv('MINDLAB_GRAPH_MIN_WEIGHT', '5'))
+
+# Retention: chat history and activities older than MINDLAB_RETENTION_DAYS (0 = keep
+# everything) move to a compressed archive database (MINDLAB_ARCHIVE_DB); every
+# MINDLAB_RETENTION_INTERVAL seconds the worker archives and returns freed pages
+archive = retention.Archive(os.getenv('MINDLAB_ARCHIVE_DB', retention.ARCHIVE_PATH))
+retention_worker = retention.RetentionWorker(lambda: get_db(), archive,
+                                             max_age_days=int(os.getenv('MINDLAB_RETENTION_DAYS', '0')),
+                                             interval=int(os.getenv('MINDLAB_RETENTION_INTERVAL', '3600')),
+                                             db_path='mindlab.db')
+
+# Clears are deleted in the background in batches of MINDLAB_DELETE_BATCH_SIZE rows;
+# the same worker removes orphaned rows every MINDLAB_ORPHAN_CLEANUP_INTERVAL seconds
+deleter = deletion.BackgroundDeleter(lambda: get_db(),
+                                     batch_size=int(os.getenv('MINDLAB_DELETE_BATCH_SIZE', '500')),
+                                     orphan_interval=int(os.getenv('MINDLAB_ORPHAN_CLEANUP_INTERVAL', '3600')),
+                                     archive=archive)
+
+# Local, model-free insight engine: 'fallback' (used when Gemini is unavailable),
+# 'fast' (answers confident topics without Gemini) or 'local' (never calls Gemini)
+INSIGHT_ENGINE_MODE = os.getenv('MINDLAB_INSIGHT_ENGINE', 'fallback').strip().lower()
+INSIGHT_ENGINE_CONFIDENCE = float(os.getenv('MINDLAB_INSIGHT_CONFIDENCE', '0.8'))
+insight_engine = InsightEngine(library, match_threshold=INSIGHT_ENGINE_CONFIDENCE)
+
 # Database initialization
-def init_db():
-    conn = sqlite3.connect('mindlab.db')
-    c = conn.cursor()
-    
+def create_tables(c):
     # Users table
     c.execute('''CREATE TABLE IF NOT EXISTS users
                  (id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -58,6 +103,11 @@ def init_db():
                   verification_token TEXT,
                   created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
     
+    # Databases created before foreign keys cascaded are migrated: the old
+    # tables are renamed here and copied into the new ones below. Leftover
+    # *_legacy tables from an interrupted migration are copied as well
+    legacy_tables = deletion.rename_legacy_tables(c)
+    
     # Concepts table
     c.execute('''CREATE TABLE IF NOT EXISTS concepts
                  (id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -66,7 +116,7 @@ def init_db():
                   content TEXT,
                   difficulty_level TEXT,
                   created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                  FOREIGN KEY (user_id) REFERENCES users (id))''')
+                  FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE)''')
     
     # Activities table
     c.execute('''CREATE TABLE IF NOT EXISTS activities
@@ -76,7 +126,7 @@ def init_db():
                   activity_data TEXT,
                   score INTEGER,
                   completed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                  FOREIGN KEY (concept_id) REFERENCES concepts (id))''')
+                  FOREIGN KEY (concept_id) REFERENCES concepts (id) ON DELETE CASCADE)''')
     
     # Chat history table
     c.execute('''CREATE TABLE IF NOT EXISTS chat_history
@@ -85,15 +135,55 @@ def init_db():
                   message TEXT NOT NULL,
                   response TEXT NOT NULL,
                   created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                  FOREIGN KEY (user_id) REFERENCES users (id))''')
+                  FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE)''')
+    
+    deletion.copy_legacy_tables(c, legacy_tables)
+    
+    # Clear watermarks and the indexes background deletion relies on
+    deletion.init_schema(c)
+    
+    # Topic co-occurrence graph (see topic_graph.py), backfilled from
+    # existing concepts the first time it is created
+    topic_graph.init_schema(c)
+
+def init_db():
+    conn = sqlite3.connect('mindlab.db')
+    c = conn.cursor()
+    
+    # With retention on, freed pages are returned to the filesystem by the
+    # retention worker. Converting an existing database VACUUMs it once, so
+    # it only happens when retention is enabled
+    if retention_worker.max_age_days > 0:
+        retention.enable_incremental_vacuum(conn)
+    
+    # Schema changes run in one transaction, so a crash part-way through the
+    # cascade migration rolls back instead of stranding rows in *_legacy
+    # tables (SQLite DDL is transactional)
+    c.execute('BEGIN')
+    try:
+        create_tables(c)
+    except Exception:
+        conn.rollback()
+        conn.close()
+        raise
+    conn.commit()
+    if c.execute('SELECT 1 FROM topic_edges LIMIT 1').fetchone() is None:
+        topic_graph.rebuild(conn, TOPIC_GRAPH_SESSION_GAP)
     
     conn.commit()
     conn.close()
+    
+    # Archive database for old chat history and activities (see retention.py).
+    # It is only created once retention is enabled; reads and clears skip a
+    # missing archive
+    if retention_worker.max_age_days > 0:
+        archive.init_schema()
 
 # Database helper functions
 def get_db():
     conn = sqlite3.connect('mindlab.db')
     conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA foreign_keys = ON')
     return conn
 
 def query_db(query, args=(), one=False, insert=False):
@@ -228,15 +318,64 @@ def logout():
 @login_required
 def dashboard():
     user_id = session['user_id']
-    concepts = query_db('SELECT * FROM concepts WHERE user_id = ? ORDER BY created_at DESC LIMIT 10', (user_id,))
-    return render_template('dashboard.html', concepts=concepts)
+    concepts = query_db(f'SELECT * FROM concepts WHERE user_id = ? AND {deletion.not_cleared("concepts")} '
+                        'ORDER BY created_at DESC LIMIT 10', (user_id, user_id))
+    return render_template('dashboard.html', concepts=concepts,
+                           recommendations=recommend_topics(concepts))
+
+def recommend_topics(concepts, k=5):
+    """Next topics for a learner: what others studied after their recent topics
+    (source 'learners'), padded with curated related topics (source 'curated')"""
+    recent = []
+    for concept in concepts:
+        if concept['topic'] not in recent:
+            recent.append(concept['topic'])
+    if not recent:
+        return []
+    
+    conn = get_db()
+    recommendations = [dict(item, source='learners')
+                       for item in topic_graph.recommend(conn, recent[:3], k=k, exclude=recent)]
+    conn.close()
+    
+    seen = {topic_graph.topic_key(topic) for topic in recent}
+    seen.update(topic_graph.topic_key(item['topic']) for item in recommendations)
+    for topic in recent[:3]:
+        record = library.lookup(topic)
+        for name in (record['related'] if record else []):
+            if len(recommendations) >= k:
+                return recommendations
+            if topic_graph.topic_key(name) not in seen:
+                seen.add(topic_graph.topic_key(name))
+                recommendations.append({'topic': name, 'score': 0, 'source': 'curated'})
+    return recommendations
+
+def graph_related_topics(topic, k=5):
+    """Next topics from the topic graph, once enough learners have moved on from `topic`"""
+    conn = get_db()
+    topics = topic_graph.next_topics(conn, topic, k)
+    conn.close()
+    if sum(item['weight'] for item in topics) < TOPIC_GRAPH_MIN_WEIGHT:
+        return None
+    return [item['topic'] for item in topics]
+
+@app.route('/api/next-topics/<topic>')
+@login_required
+def next_topics(topic):
+    """Top-k topics learners study after this one"""
+    k = min(max(request.args.get('k', 5, type=int), 1), 50)
+    conn = get_db()
+    topics = topic_graph.next_topics(conn, topic, k)
+    conn.close()
+    return jsonify({'topic': topic, 'next_topics': topics})
 
 @app.route('/clear-concepts', methods=['POST'])
 @login_required
 def clear_concepts():
     user_id = session['user_id']
-    query_db('DELETE FROM concepts WHERE user_id = ?', (user_id,))
-    query_db('DELETE FROM activities WHERE concept_id IN (SELECT id FROM concepts WHERE user_id = ?)', (user_id,))
+    # Hidden immediately; concepts and their activities are deleted in
+    # small batches in the background
+    deleter.clear(user_id, 'concepts')
     flash('All concepts cleared successfully!', 'success')
     return redirect(url_for('dashboard'))
 
@@ -247,9 +386,15 @@ def concept_playground():
         topic = request.form.get('topic')
         if topic:
             user_id = session['user_id']
-            # Save concept
-            concept_id = query_db('INSERT INTO concepts (user_id, topic) VALUES (?, ?)',
-                                 (user_id, topic), insert=True)
+            # Save concept and count the step from the previous topic of this
+            # study session in the topic graph, in one transaction
+            conn = get_db()
+            previous = topic_graph.previous_topic(conn, user_id, TOPIC_GRAPH_SESSION_GAP)
+            conn.execute('INSERT INTO concepts (user_id, topic) VALUES (?, ?)', (user_id, topic))
+            if previous:
+                topic_graph.record_transition(conn, previous, topic)
+            conn.commit()
+            conn.close()
             return redirect(url_for('playground_activity', topic=topic))
     
     return render_template('concept_playground.html')
@@ -263,6 +408,35 @@ def playground_activity(topic):
 @login_required
 def generate_activities(topic):
     """Generate different types of activities for a topic"""
+    activities = activity_cache.get(topic)
+    prefetcher.record_request(topic, activities is not None)
+    if activities is None:
+        with prefetcher.foreground():
+            activities, generated = build_activity_set(topic)
+        # Sets with fallback content (no Gemini, budget exhausted, model
+        # errors) are served but never cached
+        if generated:
+            activity_cache.put(topic, activities)
+    return jsonify(activities)
+
+@app.route('/api/prefetch-stats')
+@login_required
+def prefetch_stats():
+    return jsonify(prefetcher.snapshot())
+
+@app.route('/api/hedge-stats')
+@login_required
+def hedge_stats():
+    if hedged_gemini is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(hedged_gemini.snapshot(), enabled=True))
+
+# Set by activity_fallback() while build_activity_set() runs on this thread
+_activity_build = threading.local()
+
+def build_activity_set(topic):
+    """Build the activity set for a topic; returns (activities, every activity came from Gemini)"""
+    _activity_build.fallback = False
     activities = {
         'drag_drop': generate_drag_drop(topic),
         'fill_blanks': generate_fill_blanks(topic),
@@ -270,24 +444,58 @@ def generate_activities(topic):
         'quiz': generate_quiz(topic),
         'concept_flow': generate_concept_flow(topic)
     }
-    return jsonify(activities)
+    return activities, not _activity_build.fallback
+
+def activity_fallback(topic, activity_type):
+    """Curated fallback payload; marks the activity set being built as fallback content"""
+    _activity_build.fallback = True
+    return library.get(topic, activity_type)
+
+# Opt-in speculative prefetch of activity sets for related topics
+# (MINDLAB_PREFETCH_TOPICS = how many related topics to prefetch, 0 = off)
+prefetcher = PrefetchScheduler(build_activity_set, activity_cache, llm_budget,
+                               top_n=PREFETCH_TOPICS if GEMINI_AVAILABLE else 0,
+                               set_cost=5)
+
+# Use gemini-2.0-flash (fast and stable) or fallback to gemini-2.5-flash
+GEMINI_MODEL_NAMES = ['gemini-2.0-flash', 'gemini-2.5-flash', 'gemini-1.5-flash']
+
+def gemini_generate(model_name, prompt, temperature):
+    """Single Gemini request against one model"""
+    model = genai.GenerativeModel(model_name)
+    response = model.generate_content(prompt, generation_config=genai.types.GenerationConfig(temperature=temperature))
+    return response.text
+
+# Optional hedging: if the primary model is slower than this percentile of its
+# recent latency, race the next model (MINDLAB_HEDGE_PERCENTILE, 0 = off).
+# Hedges are capped to MINDLAB_HEDGE_MAX_RATE of calls and count against the budget;
+# hedges run on a pool of MINDLAB_HEDGE_WORKERS threads and none is sent while it is full.
+HEDGE_PERCENTILE = float(os.getenv('MINDLAB_HEDGE_PERCENTILE', '0'))
+hedged_gemini = None
+if GEMINI_AVAILABLE and HEDGE_PERCENTILE > 0:
+    hedged_gemini = HedgedCaller(gemini_generate, GEMINI_MODEL_NAMES,
+                                 percentile=HEDGE_PERCENTILE,
+                                 max_hedge_rate=float(os.getenv('MINDLAB_HEDGE_MAX_RATE', '0.1')),
+                                 max_workers=int(os.getenv('MINDLAB_HEDGE_WORKERS', '8')),
+                                 acquire=llm_budget.try_acquire)
 
 def call_gemini(prompt, temperature=0.7):
     """Call Gemini API with a prompt"""
     if not GEMINI_AVAILABLE or genai is None:
         return None
+    if not llm_budget.try_acquire():
+        print("⚠ Warning: LLM call budget exhausted. Using fallback responses.")
+        return None
     
     try:
-        # Use gemini-2.0-flash (fast and stable) or fallback to gemini-2.5-flash
-        model_names = ['gemini-2.0-flash', 'gemini-2.5-flash', 'gemini-1.5-flash']
+        if hedged_gemini is not None:
+            return hedged_gemini(prompt, temperature)
         
-        for model_name in model_names:
+        for model_name in GEMINI_MODEL_NAMES:
             try:
-                model = genai.GenerativeModel(model_name)
-                response = model.generate_content(prompt, generation_config=genai.types.GenerationConfig(temperature=temperature))
-                return response.text
+                return gemini_generate(model_name, prompt, temperature)
             except Exception as e1:
-                if model_name != model_names[-1]:  # Not the last one
+                if model_name != GEMINI_MODEL_NAMES[-1]:  # Not the last one
                     continue
                 else:
                     raise e1
@@ -330,33 +538,8 @@ The items should be key terms/concepts related to {topic}, and targets should be
             except:
                 pass
     
-    # Fallback to templates
-    templates = {
-        'photosynthesis': {
-            'title': 'Photosynthesis Process',
-            'items': ['Sunlight', 'Water', 'Carbon Dioxide', 'Chlorophyll', 'Oxygen', 'Glucose'],
-            'targets': ['Energy Source', 'Reactants', 'Catalyst', 'Products'],
-            'correct_mapping': {
-                'Sunlight': 'Energy Source',
-                'Chlorophyll': 'Catalyst',
-                'Water': 'Reactants',
-                'Carbon Dioxide': 'Reactants',
-                'Oxygen': 'Products',
-                'Glucose': 'Products'
-            }
-        },
-        'default': {
-            'title': f'{topic} - Key Components',
-            'items': [f'{topic} Component 1', f'{topic} Component 2', f'{topic} Component 3'],
-            'targets': ['Category A', 'Category B', 'Category C'],
-            'correct_mapping': {
-                f'{topic} Component 1': 'Category A',
-                f'{topic} Component 2': 'Category B',
-                f'{topic} Component 3': 'Category C'
-            }
-        }
-    }
-    return templates.get(topic.lower(), templates['default'])
+    # Fallback to the curated content library
+    return activity_fallback(topic, 'drag_drop')
 
 def generate_reorder(topic):
     """Generate reorder steps activity using Gemini API"""
@@ -383,29 +566,8 @@ The steps should describe a process or sequence related to {topic}. Include 5-7
             except:
                 pass
     
-    # Fallback to templates
-    templates = {
-        'photosynthesis': {
-            'title': 'Order the Photosynthesis Steps',
-            'steps': [
-                'Light energy is absorbed by chlorophyll',
-                'Water molecules are split',
-                'Carbon dioxide enters the leaf',
-                'Glucose is produced',
-                'Oxygen is released'
-            ]
-        },
-        'default': {
-            'title': f'{topic} - Process Steps',
-            'steps': [
-                f'Step 1: Introduction to {topic}',
-                f'Step 2: Understanding {topic} concepts',
-                f'Step 3: Applying {topic}',
-                f'Step 4: Advanced {topic} topics'
-            ]
-        }
-    }
-    return templates.get(topic.lower(), templates['default'])
+    # Fallback to the curated content library
+    return activity_fallback(topic, 'reorder')
 
 def generate_fill_blanks(topic):
     """Generate fill-in-the-blanks activity using Gemini API"""
@@ -433,20 +595,8 @@ Create 3-5 blanks in a coherent paragraph explaining {topic}. The answers should
             except:
                 pass
     
-    # Fallback to templates
-    templates = {
-        'photosynthesis': {
-            'title': 'Complete the Photosynthesis Description',
-            'text': 'Photosynthesis is the process by which plants convert __1__ and __2__ into __3__ using __4__ from sunlight.',
-            'blanks': ['carbon dioxide', 'water', 'glucose', 'energy']
-        },
-        'default': {
-            'title': f'Complete the {topic} Description',
-            'text': f'{topic} is an important concept that involves __1__ and __2__ to achieve __3__.',
-            'blanks': ['component1', 'component2', 'goal']
-        }
-    }
-    return templates.get(topic.lower(), templates['default'])
+    # Fallback to the curated content library
+    return activity_fallback(topic, 'fill_blanks')
 
 def generate_flashcards(topic):
     """Generate flashcards using Gemini API"""
@@ -475,21 +625,8 @@ Create 4-6 flashcards with questions on the front and clear, concise answers on
             except:
                 pass
     
-    # Fallback to templates
-    templates = {
-        'photosynthesis': [
-            {'front': 'What is photosynthesis?', 'back': 'The process by which plants convert light energy into chemical energy.'},
-            {'front': 'What are the reactants?', 'back': 'Carbon dioxide and water.'},
-            {'front': 'What are the products?', 'back': 'Glucose and oxygen.'},
-            {'front': 'Where does photosynthesis occur?', 'back': 'In the chloroplasts of plant cells.'}
-        ],
-        'default': [
-            {'front': f'What is {topic}?', 'back': f'{topic} is a fundamental concept in this field.'},
-            {'front': f'Why is {topic} important?', 'back': f'{topic} helps us understand key principles.'},
-            {'front': f'How does {topic} work?', 'back': f'{topic} operates through specific mechanisms.'}
-        ]
-    }
-    return templates.get(topic.lower(), templates['default'])
+    # Fallback to the curated content library
+    return activity_fallback(topic, 'flashcards')
 
 def generate_quiz(topic):
     """Generate mini quiz using Gemini API"""
@@ -522,45 +659,8 @@ Create 3-5 questions with 4 options each. The "correct" field should be the inde
             except:
                 pass
     
-    # Fallback to templates
-    templates = {
-        'photosynthesis': {
-            'title': f'{topic} Quiz',
-            'questions': [
-                {
-                    'question': 'What is the primary source of energy for photosynthesis?',
-                    'options': ['Water', 'Sunlight', 'Carbon Dioxide', 'Oxygen'],
-                    'correct': 1
-                },
-                {
-                    'question': 'Which gas is released during photosynthesis?',
-                    'options': ['Carbon Dioxide', 'Nitrogen', 'Oxygen', 'Hydrogen'],
-                    'correct': 2
-                },
-                {
-                    'question': 'Where does photosynthesis primarily occur?',
-                    'options': ['Roots', 'Stem', 'Leaves', 'Flowers'],
-                    'correct': 2
-                }
-            ]
-        },
-        'default': {
-            'title': f'{topic} Quiz',
-            'questions': [
-                {
-                    'question': f'What is a key aspect of {topic}?',
-                    'options': ['Option A', 'Option B', 'Option C', 'Option D'],
-                    'correct': 0
-                },
-                {
-                    'question': f'Which statement about {topic} is true?',
-                    'options': ['Statement 1', 'Statement 2', 'Statement 3', 'Statement 4'],
-                    'correct': 1
-                }
-            ]
-        }
-    }
-    return templates.get(topic.lower(), templates['default'])
+    # Fallback to the curated content library
+    return activity_fallback(topic, 'quiz')
 
 def generate_concept_flow(topic):
     """Generate concept flow builder activity using Gemini API"""
@@ -594,40 +694,16 @@ Create 4-6 steps that represent a logical sequence or process related to {topic}
             except:
                 pass
     
-    # Fallback to templates
-    templates = {
-        'photosynthesis': {
-            'title': 'Photosynthesis Process Flow',
-            'steps': [
-                {'id': 1, 'text': 'Light energy absorbed'},
-                {'id': 2, 'text': 'Water molecules split'},
-                {'id': 3, 'text': 'Carbon dioxide enters'},
-                {'id': 4, 'text': 'Glucose produced'},
-                {'id': 5, 'text': 'Oxygen released'}
-            ],
-            'correct_flow': [1, 2, 3, 4, 5]
-        },
-        'default': {
-            'title': f'{topic} Concept Flow',
-            'steps': [
-                {'id': 1, 'text': f'Introduction to {topic}'},
-                {'id': 2, 'text': f'Understanding {topic} basics'},
-                {'id': 3, 'text': f'Applying {topic} concepts'},
-                {'id': 4, 'text': f'Advanced {topic} topics'},
-                {'id': 5, 'text': f'Mastering {topic}'}
-            ],
-            'correct_flow': [1, 2, 3, 4, 5]
-        }
-    }
-    return templates.get(topic.lower(), templates['default'])
+    # Fallback to the curated content library
+    return activity_fallback(topic, 'concept_flow')
 
 @app.route('/api/save-activity', methods=['POST'])
 @login_required
 def save_activity():
     data = request.json
     user_id = session['user_id']
-    concept = query_db('SELECT id FROM concepts WHERE user_id = ? AND topic = ?', 
-                      (user_id, data['topic']), one=True)
+    concept = query_db(f'SELECT id FROM concepts WHERE user_id = ? AND topic = ? AND {deletion.not_cleared("concepts")}',
+                      (user_id, data['topic'], user_id), one=True)
     
     if concept:
         import json
@@ -643,13 +719,25 @@ def pattern_insight():
         topic = request.form.get('topic')
         if topic:
             insights = generate_insights(topic)
+            # What learners actually study next beats generated suggestions
+            related = graph_related_topics(topic)
+            if related:
+                insights['related_topics'] = related
+            prefetcher.schedule(insights.get('related_topics', []))
             return render_template('pattern_insight.html', topic=topic, insights=insights)
     
     return render_template('pattern_insight.html')
 
 def generate_insights(topic):
     """Generate AI pattern insights for a topic using Gemini API"""
-    if GEMINI_AVAILABLE:
+    # The local insight engine answers directly in 'local' mode, and in 'fast'
+    # mode for curated topics and close variants of their names
+    if INSIGHT_ENGINE_MODE in ('fast', 'local'):
+        insights, confidence = insight_engine.analyze(topic)
+        if INSIGHT_ENGINE_MODE == 'local' or confidence >= INSIGHT_ENGINE_CONFIDENCE:
+            return insights
+    
+    if GEMINI_AVAILABLE and INSIGHT_ENGINE_MODE != 'local':
         prompt = f"""Analyze the topic "{topic}" and provide educational insights.
 
 Return ONLY a JSON object with this exact structure:
@@ -674,61 +762,13 @@ Provide insightful analysis. Patterns should be key themes or concepts. Difficul
                 result = json.loads(json_str)
                 # Ensure difficulty is valid
                 if result.get('difficulty') not in ['basic', 'intermediate', 'expert']:
-                    result['difficulty'] = 'intermediate'
+                    result['difficulty'] = library.guess_difficulty(topic)
                 return result
             except Exception as e:
                 print(f"Error parsing Gemini insights: {e}")
     
-    # Fallback to rule-based pattern mapping
-    topic_lower = topic.lower()
-    
-    # Summarization
-    summaries = {
-        'photosynthesis': 'Photosynthesis is the biological process by which plants, algae, and some bacteria convert light energy into chemical energy stored in glucose molecules.',
-        'default': f'{topic} is a fundamental concept that involves understanding key principles and their applications.'
-    }
-    summary = summaries.get(topic_lower, summaries['default'])
-    
-    # Pattern recognition
-    patterns = {
-        'photosynthesis': ['Energy conversion', 'Chemical reactions', 'Biological processes', 'Plant biology'],
-        'default': ['Core concepts', 'Key principles', 'Fundamental mechanisms', 'Practical applications']
-    }
-    recognized_patterns = patterns.get(topic_lower, patterns['default'])
-    
-    # Difficulty level prediction
-    difficulty_keywords = {
-        'basic': ['introduction', 'basics', 'fundamentals', 'simple'],
-        'intermediate': ['advanced', 'complex', 'detailed', 'analysis'],
-        'expert': ['research', 'theoretical', 'quantum', 'molecular']
-    }
-    difficulty = 'intermediate'
-    for level, keywords in difficulty_keywords.items():
-        if any(kw in topic_lower for kw in keywords):
-            difficulty = level
-            break
-    
-    # Concept explanation
-    explanations = {
-        'photosynthesis': 'Photosynthesis occurs in two main stages: light-dependent reactions (capturing light energy) and light-independent reactions (Calvin cycle, producing glucose).',
-        'default': f'{topic} can be understood through systematic study of its components, relationships, and real-world applications.'
-    }
-    explanation = explanations.get(topic_lower, explanations['default'])
-    
-    # Related topics
-    related = {
-        'photosynthesis': ['Cellular respiration', 'Chloroplasts', 'Plant biology', 'Energy flow', 'Ecosystems'],
-        'default': [f'{topic} applications', f'{topic} theory', f'Advanced {topic}', f'{topic} examples']
-    }
-    related_topics = related.get(topic_lower, related['default'])
-    
-    return {
-        'summary': summary,
-        'patterns': recognized_patterns,
-        'difficulty': difficulty,
-        'explanation': explanation,
-        'related_topics': related_topics
-    }
+    # Fallback to the local insight engine
+    return insight_engine.analyze(topic)[0]
 
 @app.route('/chatbot', methods=['GET', 'POST'])
 @login_required
@@ -746,17 +786,57 @@ def chatbot():
             return jsonify({'response': response})
     
     # Get chat history
-    user_id = session['user_id']
-    history = query_db('SELECT * FROM chat_history WHERE user_id = ? ORDER BY created_at DESC LIMIT 20', 
-                      (user_id,))
+    history = chat_history_page(session['user_id'])
     
     return render_template('chatbot.html', history=history)
 
+def chat_history_page(user_id, before=None, limit=20):
+    """Newest chat messages first, continuing into the archive once the hot rows run out"""
+    # Clamp to SQLite's integer range; larger values would overflow the bind
+    before = 2 ** 63 - 1 if before is None else max(-2 ** 63, min(before, 2 ** 63 - 1))
+    history = [dict(row, archived=False) for row in query_db(
+        f'SELECT id, message, response, created_at FROM chat_history WHERE user_id = ? AND id < ? '
+        f'AND {deletion.not_cleared("chat_history")} ORDER BY created_at DESC, id DESC LIMIT ?',
+        (user_id, before, user_id, limit))]
+    if len(history) < limit:
+        if history:
+            before = min(row['id'] for row in history)
+        history += archive.rows('chat_history', user_id, before=before, limit=limit - len(history),
+                                after=chat_watermark(user_id))
+    return history
+
+def chat_watermark(user_id):
+    """Highest chat row id the user has cleared"""
+    row = query_db("SELECT max_id FROM clear_watermarks WHERE user_id = ? AND table_name = 'chat_history'",
+                   (user_id,), one=True)
+    return row['max_id'] if row else 0
+
+@app.route('/api/chat-history')
+@login_required
+def chat_history():
+    """Page through chat history, older pages come from the archive on demand"""
+    limit = max(1, min(request.args.get('limit', 20, type=int), 100))
+    history = chat_history_page(session['user_id'], request.args.get('before', type=int), limit)
+    return jsonify({'messages': history,
+                    'next_before': min(row['id'] for row in history) if len(history) == limit else None})
+
+@app.route('/api/chat-history/archived')
+@login_required
+def archived_chat_history():
+    """Summaries of archived chat segments, without decompressing them"""
+    user_id = session['user_id']
+    return jsonify(archive.summaries('chat_history', user_id, after=chat_watermark(user_id)))
+
+@app.route('/api/retention-stats')
+@login_required
+def retention_stats():
+    return jsonify(retention_worker.snapshot())
+
 @app.route('/clear-chat', methods=['POST'])
 @login_required
 def clear_chat():
     user_id = session['user_id']
-    query_db('DELETE FROM chat_history WHERE user_id = ?', (user_id,))
+    deleter.clear(user_id, 'chat_history')
     flash('Chat history cleared successfully!', 'success')
     return redirect(url_for('chatbot'))
 
@@ -774,40 +854,20 @@ Provide a helpful, educational response. If relevant, mention that they can expl
         if response:
             return response.strip()
     
-    # Fallback to keyword-based responses
-    message_lower = message.lower()
-    
-    # Keyword-based responses
-    responses = {
-        'hello': 'Hello! How can I help you learn today?',
-        'hi': 'Hi there! What would you like to know?',
-        'help': 'I can help you understand concepts, answer questions, and guide your learning. What topic interests you?',
-        'photosynthesis': 'Photosynthesis is the process by which plants convert light energy into chemical energy. Would you like to learn more about it in the Concept Playground?',
-        'what is': 'I can explain concepts to you! Try asking about a specific topic, or use the Concept Playground for interactive learning.',
-        'how': 'Great question! I can help explain processes and concepts. For interactive learning, check out the Concept Playground.',
-        'why': 'That\'s an important question! Understanding the "why" helps deepen your knowledge. Would you like to explore this in the Concept Playground?',
-        'thank': 'You\'re welcome! Keep learning and exploring!',
-        'thanks': 'You\'re welcome! Feel free to ask more questions anytime.',
-    }
-    
-    # Check for keywords
-    for keyword, response in responses.items():
-        if keyword in message_lower:
-            return response
+    # Fallback to curated topic summaries and keyword-based responses
+    response = library.chatbot_reply(message)
+    if response:
+        return response
     
     # Default response
-    default_responses = [
-        "That's an interesting question! I'd recommend exploring this topic in the Concept Playground for interactive learning.",
-        "I can help you understand this better. Try using the Pattern Insight Engine to get detailed analysis, or the Concept Playground for hands-on practice.",
-        "Great question! For the best learning experience, I suggest checking out the interactive activities in the Concept Playground.",
-        "I'm here to help! You can learn more about this topic through our interactive activities or pattern insights."
-    ]
-    
-    import random
-    return random.choice(default_responses)
+    return random.choice(library.chatbot_default_responses())
 
 if __name__ == '__main__':
     init_db()
+    # Resume clears interrupted by a restart and schedule orphan cleanup
+    deleter.start()
+    # Archive old rows and vacuum on a schedule
+    retention_worker.start()
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
     app.run(debug=True)
 
@@ -0,0 +1,166 @@
+"""Benchmark write-lock hold time when clearing a heavy user's data.
+
+Fills a throwaway database (app schema, ON DELETE CASCADE, foreign keys on)
+with one heavy user's concepts, activities and chat history, then clears it
+two ways while a second thread keeps writing small rows for another user:
+
+- single: one DELETE statement per table (the old route behaviour),
+- batched: the background deleter's bounded batches.
+
+Reports how long each deleting transaction held the write lock and the
+latency the concurrent writer saw.
+
+    python benchmarks/bench_delete_lock.py --concepts 50000 --activities 10 --chat 200000
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import deletion  # noqa: E402
+
+SCHEMA = [
+    '''CREATE TABLE users (id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT)''',
+    '''CREATE TABLE concepts
+       (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, topic TEXT NOT NULL, content TEXT,
+        difficulty_level TEXT, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE)''',
+    '''CREATE TABLE activities
+       (id INTEGER PRIMARY KEY AUTOINCREMENT, concept_id INTEGER, activity_type TEXT NOT NULL,
+        activity_data TEXT, score INTEGER, completed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (concept_id) REFERENCES concepts (id) ON DELETE CASCADE)''',
+    '''CREATE TABLE chat_history
+       (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, message TEXT NOT NULL,
+        response TEXT NOT NULL, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE)''',
+    'CREATE INDEX idx_concepts_user_created ON concepts (user_id, created_at)',
+]
+
+HEAVY_USER, OTHER_USER = 1, 2
+
+
+def connector(path):
+    def connect():
+        conn = sqlite3.connect(path, timeout=30)
+        conn.execute('PRAGMA foreign_keys = ON')
+        return conn
+    return connect
+
+
+def populate(connect, concepts, activities, chat):
+    conn = connect()
+    for statement in SCHEMA:
+        conn.execute(statement)
+    deletion.init_schema(conn.cursor())
+    conn.executemany('INSERT INTO users (id, username) VALUES (?, ?)', [(HEAVY_USER, 'heavy'), (OTHER_USER, 'other')])
+    conn.executemany('INSERT INTO concepts (user_id, topic) VALUES (?, ?)',
+                     ((HEAVY_USER, f'topic {i}') for i in range(concepts)))
+    conn.executemany('INSERT INTO activities (concept_id, activity_type, activity_data, score) VALUES (?, ?, ?, ?)',
+                     ((c, 'quiz', '{"answers": [1, 2, 3, 4]}', 80)
+                      for c in range(1, concepts + 1) for _ in range(activities)))
+    conn.executemany('INSERT INTO chat_history (user_id, message, response) VALUES (?, ?, ?)',
+                     ((HEAVY_USER, f'question {i}', 'An answer of typical chatbot length. ' * 4)
+                      for i in range(chat)))
+    conn.commit()
+    conn.close()
+
+
+class Writer(threading.Thread):
+    """Another user's small writes, timing each insert + commit"""
+
+    def __init__(self, connect, interval=0.002):
+        super().__init__(daemon=True)
+        self.connect = connect
+        self.interval = interval
+        self.latencies = []
+        self.stop = threading.Event()
+
+    def run(self):
+        conn = self.connect()
+        while not self.stop.is_set():
+            start = time.perf_counter()
+            conn.execute('INSERT INTO chat_history (user_id, message, response) VALUES (?, ?, ?)',
+                         (OTHER_USER, 'hi', 'hello'))
+            conn.commit()
+            self.latencies.append(time.perf_counter() - start)
+            time.sleep(self.interval)
+        conn.close()
+
+
+def summarize(name, holds, writer, elapsed):
+    holds = sorted(holds)
+    waits = sorted(writer.latencies) or [0.0]
+
+    def pct(values, p):
+        return values[min(len(values) - 1, int(p / 100.0 * len(values)))] * 1000
+
+    print(f"{name:<8} total {elapsed:7.2f} s | lock held: {len(holds):5d} txns, "
+          f"max {holds[-1] * 1000:9.1f} ms, p99 {pct(holds, 99):8.1f} ms | "
+          f"other writer: p50 {pct(waits, 50):6.2f} ms, p99 {pct(waits, 99):8.1f} ms, "
+          f"max {waits[-1] * 1000:9.1f} ms")
+
+
+def single(connect, holds):
+    conn = connect()
+    for statement in ('DELETE FROM activities WHERE concept_id IN (SELECT id FROM concepts WHERE user_id = ?)',
+                      'DELETE FROM concepts WHERE user_id = ?',
+                      'DELETE FROM chat_history WHERE user_id = ?'):
+        start = time.perf_counter()
+        conn.execute(statement, (HEAVY_USER,))
+        conn.commit()
+        holds.append(time.perf_counter() - start)
+    conn.close()
+
+
+def batched(connect, holds, batch_size, pause):
+    conn = connect()
+    marks = {table: deletion.mark_cleared(conn, HEAVY_USER, table) for table in ('concepts', 'chat_history')}
+    conn.close()
+    for table, max_id in marks.items():
+        deletion.clear_user_rows(connect, HEAVY_USER, table, max_id, batch_size=batch_size, pause=pause,
+                                 on_batch=lambda rows, seconds: holds.append(seconds))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concepts', type=int, default=50000)
+    parser.add_argument('--activities', type=int, default=10, help='activities per concept')
+    parser.add_argument('--chat', type=int, default=200000)
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--pause', type=float, default=0.01)
+    args = parser.parse_args()
+
+    print(f"Heavy user: {args.concepts:,} concepts, {args.concepts * args.activities:,} activities, "
+          f"{args.chat:,} chat messages; batch size {args.batch_size}")
+    for name in ('single', 'batched'):
+        with tempfile.TemporaryDirectory() as tmp:
+            connect = connector(os.path.join(tmp, 'bench.db'))
+            populate(connect, args.concepts, args.activities, args.chat)
+            writer = Writer(connect)
+            writer.start()
+            time.sleep(0.2)
+            holds = []
+            start = time.perf_counter()
+            if name == 'single':
+                single(connect, holds)
+            else:
+                batched(connect, holds, args.batch_size, args.pause)
+            elapsed = time.perf_counter() - start
+            writer.stop.set()
+            writer.join()
+
+            conn = connect()
+            left = sum(conn.execute(f'SELECT COUNT(*) FROM {t}').fetchone()[0] for t in ('concepts', 'activities'))
+            left += conn.execute('SELECT COUNT(*) FROM chat_history WHERE user_id = ?', (HEAVY_USER,)).fetchone()[0]
+            conn.close()
+            assert left == 0, f'{left} rows left after {name} delete'
+            summarize(name, holds, writer, elapsed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""Benchmark hedged Gemini calls against the plain fallback chain.
+
+Uses a fake client whose models usually answer in ~20 ms but occasionally
+stall, which is what drives our p99. Prints latency percentiles for both
+strategies and the extra-call overhead of hedging.
+
+    python benchmarks/bench_hedging.py --requests 2000 --slow-rate 0.03
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hedging import HedgedCaller  # noqa: E402
+
+MODELS = ['gemini-2.0-flash', 'gemini-2.5-flash', 'gemini-1.5-flash']
+
+
+class FakeClient:
+    """Stands in for genai: log-normal latency with an occasional slow tail"""
+
+    def __init__(self, median=0.02, slow_rate=0.03, slow_factor=10.0, error_rate=0.0, seed=0):
+        self.median = median
+        self.slow_rate = slow_rate
+        self.slow_factor = slow_factor
+        self.error_rate = error_rate
+        self.calls = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def generate(self, model_name, prompt, temperature):
+        with self._lock:
+            self.calls += 1
+            latency = self.median * self._rng.lognormvariate(0, 0.25)
+            if self._rng.random() < self.slow_rate:
+                latency *= self.slow_factor
+            failed = self._rng.random() < self.error_rate
+        time.sleep(latency)
+        if failed:
+            raise RuntimeError(f'{model_name} unavailable')
+        return f'{model_name}: {prompt}'
+
+
+def sequential_call(client, prompt, temperature):
+    """Mirror of call_gemini without hedging"""
+    for model_name in MODELS:
+        try:
+            return client.generate(model_name, prompt, temperature)
+        except Exception:
+            if model_name == MODELS[-1]:
+                raise
+
+
+def run(call, requests, concurrency):
+    latencies = []
+    lock = threading.Lock()
+
+    def one(i):
+        start = time.perf_counter()
+        try:
+            call(f'topic {i}', 0.7)
+        except Exception:
+            pass
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(requests)))
+    return sorted(latencies)
+
+
+def pct(sorted_values, p):
+    index = min(len(sorted_values) - 1, int(round(p / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index] * 1000
+
+
+def report(name, latencies, calls, requests):
+    print(f"{name:<12} p50 {pct(latencies, 50):7.1f} ms  p95 {pct(latencies, 95):7.1f} ms  "
+          f"p99 {pct(latencies, 99):7.1f} ms  max {latencies[-1] * 1000:7.1f} ms  "
+          f"calls/request {calls / requests:.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--slow-rate', type=float, default=0.03)
+    parser.add_argument('--slow-factor', type=float, default=10.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--percentile', type=float, default=95)
+    parser.add_argument('--max-hedge-rate', type=float, default=0.1)
+    parser.add_argument('--workers', type=int, default=8,
+                        help='hedge pool size (MINDLAB_HEDGE_WORKERS); primary calls never use it')
+    args = parser.parse_args()
+
+    client_kwargs = dict(slow_rate=args.slow_rate, slow_factor=args.slow_factor, error_rate=args.error_rate)
+
+    baseline_client = FakeClient(**client_kwargs)
+    baseline = run(lambda p, t: sequential_call(baseline_client, p, t), args.requests, args.concurrency)
+
+    hedged_client = FakeClient(**client_kwargs)
+    caller = HedgedCaller(hedged_client.generate, MODELS, percentile=args.percentile,
+                          max_hedge_rate=args.max_hedge_rate, max_workers=args.workers)
+    # Warm the latency window so the first requests use a real percentile
+    run(caller, caller.min_samples, 1)
+    warmup_calls = hedged_client.calls
+    stats_before = dict(caller.stats)
+    hedged = run(caller, args.requests, args.concurrency)
+    time.sleep(args.slow_factor * 0.05)  # let ignored losers finish so their calls are counted
+
+    print(f"{args.requests} requests, concurrency {args.concurrency}, "
+          f"{args.slow_rate:.1%} slow calls (x{args.slow_factor:g}), hedge at p{args.percentile:g}, "
+          f"cap {args.max_hedge_rate:.0%}, {args.workers} workers")
+    report('sequential', baseline, baseline_client.calls, args.requests)
+    report('hedged', hedged, hedged_client.calls - warmup_calls, args.requests)
+
+    hedges = caller.stats['hedges'] - stats_before['hedges']
+    wins = caller.stats['hedge_wins'] - stats_before['hedge_wins']
+    extra = (hedged_client.calls - warmup_calls) / args.requests - baseline_client.calls / args.requests
+    print(f"hedges fired {hedges} ({hedges / args.requests:.1%}), won {wins}, "
+          f"capped {caller.stats['hedges_capped'] - stats_before['hedges_capped']}, "
+          f"skipped while saturated {caller.stats['hedges_saturated'] - stats_before['hedges_saturated']}")
+    print(f"p99 improvement {pct(baseline, 99) / pct(hedged, 99):.1f}x, "
+          f"extra call overhead {extra:+.1%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+"""Benchmark database size and hot-query latency before and after archival.
+
+Fills a throwaway database (app schema, incremental auto_vacuum) with a year
+of chat history and saved activities for many learners. Chat responses are
+stitched from curated explanations and activity data from the curated
+activity payloads, so both compress roughly like real rows. It then measures
+the database, archives everything older than ``--days`` with the retention
+module (timing each batch's write transaction), compacts the archive, runs
+the incremental vacuum and measures again:
+
+- file size of mindlab.db (and of the archive),
+- chatbot page: the newest 20 messages of a learner,
+- save activity: one activities insert + commit,
+- orphan sweep: the deleter's periodic full-table scan,
+- backup: copying the database with SQLite's online backup API,
+- archived page: 20 messages served from the archive.
+
+    python benchmarks/bench_retention.py --users 200 --chat 200000 --activities 200000 --days 90
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import deletion  # noqa: E402
+import retention  # noqa: E402
+from fallback_content import library  # noqa: E402
+
+SCHEMA = [
+    '''CREATE TABLE users (id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT)''',
+    '''CREATE TABLE concepts
+       (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, topic TEXT NOT NULL, content TEXT,
+        difficulty_level TEXT, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE)''',
+    '''CREATE TABLE activities
+       (id INTEGER PRIMARY KEY AUTOINCREMENT, concept_id INTEGER, activity_type TEXT NOT NULL,
+        activity_data TEXT, score INTEGER, completed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (concept_id) REFERENCES concepts (id) ON DELETE CASCADE)''',
+    '''CREATE TABLE chat_history
+       (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, message TEXT NOT NULL,
+        response TEXT NOT NULL, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE)''',
+    'CREATE INDEX idx_concepts_user_created ON concepts (user_id, created_at)',
+]
+
+ACTIVITY_TYPES = ('drag_drop', 'reorder', 'fill_blanks', 'flashcards', 'quiz', 'concept_flow')
+
+# The app's chatbot page query (chat_history_page in app.py)
+PAGE_QUERY = (f'SELECT id, message, response, created_at FROM chat_history WHERE user_id = ? AND id < ? '
+              f'AND {deletion.not_cleared("chat_history")} ORDER BY created_at DESC, id DESC LIMIT ?')
+
+
+def connector(path):
+    def connect():
+        conn = sqlite3.connect(path, timeout=30)
+        conn.execute('PRAGMA foreign_keys = ON')
+        return conn
+    return connect
+
+
+def populate(connect, users, chat, activities, year_days=365, seed=7):
+    rng = random.Random(seed)
+    sentences = [s.strip() + '.' for r in library.records
+                 for s in (r['summary'] + ' ' + r['explanation']).split('.') if s.strip()]
+    topics = [r['topic'] for r in library.records]
+
+    conn = connect()
+    retention.enable_incremental_vacuum(conn)
+    for statement in SCHEMA:
+        conn.execute(statement)
+    deletion.init_schema(conn.cursor())
+    conn.executemany('INSERT INTO users (id, username) VALUES (?, ?)', ((u, f'user {u}') for u in range(1, users + 1)))
+    concepts = max(1, activities // 5)
+    conn.executemany('INSERT INTO concepts (user_id, topic) VALUES (?, ?)',
+                     ((rng.randint(1, users), rng.choice(topics)) for _ in range(concepts)))
+
+    def timestamps(count):
+        # Oldest first, so ids follow time like they do in the app
+        return [f'-{age:.5f} days' for age in sorted((rng.uniform(0, year_days) for _ in range(count)), reverse=True)]
+
+    conn.executemany('''INSERT INTO chat_history (user_id, message, response, created_at)
+                        VALUES (?, ?, ?, datetime('now', ?))''',
+                     ((rng.randint(1, users), f'Can you explain {rng.choice(topics)}?',
+                       ' '.join(rng.sample(sentences, rng.randint(3, 7))), at)
+                      for at in timestamps(chat)))
+    conn.executemany('''INSERT INTO activities (concept_id, activity_type, activity_data, score, completed_at)
+                        VALUES (?, ?, ?, ?, datetime('now', ?))''',
+                     ((concept, kind,
+                       json.dumps({'activity': library.get(rng.choice(topics), kind),
+                                   'answers': [rng.randint(0, 3) for _ in range(rng.randint(3, 10))],
+                                   'seconds': round(rng.uniform(5, 600), 1)}),
+                       rng.randint(0, 100), at)
+                      for concept, kind, at in ((rng.randint(1, concepts), rng.choice(ACTIVITY_TYPES), at)
+                                                for at in timestamps(activities))))
+    conn.commit()
+    conn.close()
+
+
+def timed(fn, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return samples[len(samples) // 2] * 1000, samples[min(len(samples) - 1, int(0.99 * len(samples)))] * 1000
+
+
+def measure(path, connect, archive, users, runs, rng):
+    results = {'db_mb': os.path.getsize(path) / 1e6}
+
+    def page():
+        conn = connect()
+        conn.execute(PAGE_QUERY, (rng.randint(1, users), 2 ** 63 - 1, rng.randint(1, users), 20)).fetchall()
+        conn.close()
+
+    def insert():
+        conn = connect()
+        conn.execute('INSERT INTO activities (concept_id, activity_type, activity_data, score) VALUES (?, ?, ?, ?)',
+                     (1, 'quiz', '{"answers": [1, 2, 3]}', 50))
+        conn.commit()
+        conn.close()
+
+    def backup():
+        src = connect()
+        dst = sqlite3.connect(path + '.backup')
+        src.backup(dst)
+        dst.close()
+        src.close()
+        os.remove(path + '.backup')
+
+    results['page'] = timed(page, runs)
+    results['insert'] = timed(insert, runs)
+    results['orphan_sweep'] = timed(lambda: deletion.cleanup_orphans(connect, pause=0), 3)
+    results['backup'] = timed(backup, 3)
+    if archive.exists():
+        results['archive_mb'] = os.path.getsize(archive.path) / 1e6
+        results['archived_page'] = timed(
+            lambda: archive.rows('chat_history', rng.randint(1, users), limit=20), runs)
+    return results
+
+
+def archive_all(connect, archive, max_age_days, batch_size):
+    """retention.archive_old_rows, timing every batch transaction"""
+    conn = connect()
+    cutoff = conn.execute("SELECT datetime('now', ?)", (f'-{max_age_days} days',)).fetchone()[0]
+    conn.close()
+    holds, moved = [], {}
+    for source in retention.SOURCES:
+        moved[source] = 0
+        after, more = 0, True
+        while more:
+            conn = archive.attach(connect())
+            start = time.perf_counter()
+            count, after, more = retention.archive_batch(conn, source, cutoff, after, batch_size)
+            holds.append(time.perf_counter() - start)
+            conn.close()
+            moved[source] += count
+    return moved, sorted(holds)
+
+
+def report(name, r):
+    line = (f"{name:<7} db {r['db_mb']:8.1f} MB | page p50 {r['page'][0]:6.3f} ms p99 {r['page'][1]:6.3f} ms | "
+            f"insert p50 {r['insert'][0]:6.3f} ms | orphan sweep {r['orphan_sweep'][0]:8.1f} ms | "
+            f"backup {r['backup'][0]:8.1f} ms")
+    if 'archive_mb' in r:
+        line += (f"\n        archive {r['archive_mb']:5.1f} MB | archived page p50 {r['archived_page'][0]:6.3f} ms "
+                 f"p99 {r['archived_page'][1]:6.3f} ms")
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--chat', type=int, default=200000)
+    parser.add_argument('--activities', type=int, default=200000)
+    parser.add_argument('--days', type=int, default=90, help='retention age; older rows are archived')
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--runs', type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'mindlab.db')
+        connect = connector(path)
+        archive = retention.Archive(os.path.join(tmp, 'mindlab_archive.db'))
+        rng = random.Random(1)
+        start = time.perf_counter()
+        populate(connect, args.users, args.chat, args.activities)
+        print(f"{args.users} users, {args.chat:,} chat messages, {args.activities:,} activities over a year "
+              f"(built in {time.perf_counter() - start:.1f} s); archiving rows older than {args.days} days")
+        report('before', measure(path, connect, archive, args.users, args.runs, rng))
+
+        archive.init_schema()
+        start = time.perf_counter()
+        moved, holds = archive_all(connect, archive, args.days, args.batch_size)
+        archived = time.perf_counter() - start
+        start = time.perf_counter()
+        merged = archive.compact(retention.clear_watermarks(connect))
+        compacted = time.perf_counter() - start
+        start = time.perf_counter()
+        pages = retention.incremental_vacuum(connect, pause=0)
+        pages += retention.incremental_vacuum(archive.connect, pause=0)
+        vacuumed = time.perf_counter() - start
+        stats = archive.stats()
+        raw = sum(s['raw_bytes'] for s in stats.values())
+        packed = sum(s['compressed_bytes'] for s in stats.values())
+        print(f"archived {moved} in {archived:.1f} s ({len(holds)} batches, max hold "
+              f"{holds[-1] * 1000:.1f} ms, p99 {holds[min(len(holds) - 1, int(0.99 * len(holds)))] * 1000:.1f} ms); "
+              f"merged {merged:,} segments in {compacted:.1f} s; "
+              f"compression {raw / 1e6:.1f} MB -> {packed / 1e6:.1f} MB ({raw / max(packed, 1):.1f}x); "
+              f"incremental vacuum freed {pages:,} pages in {vacuumed:.2f} s")
+        report('after', measure(path, connect, archive, args.users, args.runs, rng))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+"""Benchmark the topic graph at millions of concepts.
+
+Builds a throwaway SQLite database with the app's concepts table filled by
+synthetic learners who walk a topic space with preferred next steps, then
+measures:
+
+- backfill: rebuilding every edge from the concepts table,
+- incremental update: the per-save cost of the concept insert plus the
+  edge upsert, against a plain insert,
+- query: top-k next topics from the adjacency table, against computing the
+  same answer on the fly from the concepts table.
+
+    python benchmarks/bench_topic_graph.py --concepts 2000000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import topic_graph  # noqa: E402
+
+CONCEPTS_TABLE = '''CREATE TABLE concepts
+                    (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                     user_id INTEGER,
+                     topic TEXT NOT NULL,
+                     content TEXT,
+                     difficulty_level TEXT,
+                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)'''
+
+# previous_topic() skips concepts hidden by a clear (see deletion.py)
+WATERMARKS_TABLE = '''CREATE TABLE clear_watermarks
+                      (user_id INTEGER NOT NULL, table_name TEXT NOT NULL, max_id INTEGER NOT NULL,
+                       PRIMARY KEY (user_id, table_name))'''
+
+NAIVE_NEXT = '''SELECT topic, COUNT(*) AS weight FROM
+                (SELECT topic, LAG(topic) OVER (PARTITION BY user_id ORDER BY id) AS prev_topic
+                 FROM concepts)
+                WHERE prev_topic = ? AND topic != prev_topic
+                GROUP BY topic ORDER BY weight DESC LIMIT ?'''
+
+
+def synthetic_rows(concepts, users, topics, seed):
+    """(user_id, topic, created_at) rows; each topic has a few preferred successors"""
+    rng = random.Random(seed)
+    successors = [[rng.randrange(topics) for _ in range(8)] for _ in range(topics)]
+    per_user = max(1, concepts // users)
+    for user_id in range(1, users + 1):
+        current = rng.randrange(topics)
+        minute = rng.randrange(60 * 24 * 300)
+        for _ in range(per_user):
+            yield user_id, f'synthetic topic {current}', _timestamp(minute)
+            minute += rng.choice((3, 5, 10, 20, 600))
+            current = successors[current][min(int(rng.expovariate(0.8)), 7)] if rng.random() < 0.85 \
+                else rng.randrange(topics)
+
+
+def _timestamp(minute):
+    days, rest = divmod(minute, 60 * 24)
+    hours, minutes = divmod(rest, 60)
+    month, day = divmod(days, 28)
+    return f'2025-{month % 12 + 1:02d}-{day + 1:02d} {hours:02d}:{minutes:02d}:00'
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return tuple(samples[min(len(samples) - 1, int(p / 100.0 * len(samples)))] * 1000 for p in (50, 99))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concepts', type=int, default=2000000)
+    parser.add_argument('--users', type=int, default=0, help='default: concepts / 40')
+    parser.add_argument('--topics', type=int, default=5000)
+    parser.add_argument('--updates', type=int, default=2000)
+    parser.add_argument('--queries', type=int, default=10000)
+    parser.add_argument('--naive-queries', type=int, default=3)
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    users = args.users or max(1, args.concepts // 40)
+    rng = random.Random(args.seed + 1)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(os.path.join(tmp, 'bench.db'))
+        conn.execute(CONCEPTS_TABLE)
+
+        start = time.perf_counter()
+        conn.executemany('INSERT INTO concepts (user_id, topic, created_at) VALUES (?, ?, ?)',
+                         synthetic_rows(args.concepts, users, args.topics, args.seed))
+        conn.execute(WATERMARKS_TABLE)
+        topic_graph.init_schema(conn.cursor())
+        conn.commit()
+        total = conn.execute('SELECT COUNT(*) FROM concepts').fetchone()[0]
+        print(f"Generated {total:,} concepts for {users:,} learners over {args.topics:,} topics "
+              f"in {time.perf_counter() - start:.1f} s")
+
+        start = time.perf_counter()
+        edges = topic_graph.rebuild(conn)
+        print(f"Backfill: {edges:,} edges in {time.perf_counter() - start:.1f} s")
+
+        # Incremental update, committed per save like the app does
+        plain, graph = [], []
+        for i in range(args.updates):
+            user_id = rng.randint(1, users)
+            topic = f'synthetic topic {rng.randrange(args.topics)}'
+            start = time.perf_counter()
+            if i % 2:
+                previous = topic_graph.previous_topic(conn, user_id, session_gap=10 ** 9)
+                conn.execute('INSERT INTO concepts (user_id, topic) VALUES (?, ?)', (user_id, topic))
+                if previous:
+                    topic_graph.record_transition(conn, previous, topic)
+                conn.commit()
+                graph.append(time.perf_counter() - start)
+            else:
+                conn.execute('INSERT INTO concepts (user_id, topic) VALUES (?, ?)', (user_id, topic))
+                conn.commit()
+                plain.append(time.perf_counter() - start)
+        print("Save concept           p50 %.3f ms  p99 %.3f ms" % percentiles(plain))
+        print("Save concept + graph   p50 %.3f ms  p99 %.3f ms" % percentiles(graph))
+
+        latencies = []
+        for _ in range(args.queries):
+            topic = f'synthetic topic {rng.randrange(args.topics)}'
+            start = time.perf_counter()
+            topic_graph.next_topics(conn, topic, args.k)
+            latencies.append(time.perf_counter() - start)
+        print(f"Top-{args.k} next topics (graph)      p50 %.3f ms  p99 %.3f ms" % percentiles(latencies))
+
+        if args.naive_queries:
+            latencies = []
+            for _ in range(args.naive_queries):
+                topic = f'synthetic topic {rng.randrange(args.topics)}'
+                start = time.perf_counter()
+                conn.execute(NAIVE_NEXT, (topic, args.k)).fetchall()
+                latencies.append(time.perf_counter() - start)
+            print(f"Top-{args.k} next topics (on the fly) p50 %.3f ms  p99 %.3f ms" % percentiles(latencies))
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
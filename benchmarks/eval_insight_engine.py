@@ -0,0 +1,131 @@
+"""Offline evaluation and benchmark of the local insight engine.
+
+Every curated topic is held out in turn (its own row is excluded from the
+neighbour search) and queried by name, simulating a topic the library does
+not know:
+
+- difficulty accuracy against the curated label of the keyword rule the
+  engine uses for unknown topics, of a similarity-weighted vote of the
+  nearest topics' labels and of the majority class (the engine would only
+  predict difficulty itself if something clearly beat the latter),
+- related-topic recall@k against the curated related topics that exist in
+  the library,
+- build time, index size and per-query latency.
+
+    python benchmarks/eval_insight_engine.py --queries 5000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fallback_content import ContentLibrary, normalize_topic  # noqa: E402
+from insight_engine import NUMPY_AVAILABLE, InsightEngine  # noqa: E402
+
+
+def keyword_difficulty(library, topic):
+    """The engine's rule for unknown topics: keyword match, else intermediate"""
+    topic_lower = topic.lower()
+    for level, keywords in library.defaults.get('difficulty_keywords', {}).items():
+        if any(kw in topic_lower for kw in keywords):
+            return level
+    return 'intermediate'
+
+
+def neighbour_vote(library, neighbours):
+    """Similarity-weighted vote of the neighbours' curated difficulty"""
+    votes = Counter()
+    for position, score in neighbours:
+        votes[library.records[position].get('difficulty', 'intermediate')] += score
+    return votes.most_common(1)[0][0] if votes else 'intermediate'
+
+
+def evaluate(library, engine, k):
+    records = library.records
+    majority = Counter(r.get('difficulty', 'intermediate') for r in records).most_common(1)[0][0]
+    correct = {'keyword rule': 0, 'neighbour vote': 0, 'majority class': 0}
+    recall_hits = recall_total = 0
+
+    for position, record in enumerate(records):
+        label = record.get('difficulty', 'intermediate')
+        query = record['topic']
+        neighbours = engine.neighbours(query, k=k, exclude=[position])
+        correct['keyword rule'] += keyword_difficulty(library, query) == label
+        correct['neighbour vote'] += neighbour_vote(library, neighbours) == label
+        correct['majority class'] += majority == label
+
+        found = {normalize_topic(engine.names[p]) for p, _ in neighbours}
+        for name in record['related']:
+            target = library.lookup(name)
+            if target is None or target is record:
+                continue
+            recall_total += 1
+            recall_hits += normalize_topic(target['topic']) in found
+
+    print(f"Leave-one-out over {len(records)} curated topics")
+    for name, hits in correct.items():
+        print(f"  difficulty accuracy ({name}): {hits / len(records):.1%}")
+    if recall_total:
+        print(f"  related-topic recall@{k}: {recall_hits / recall_total:.1%} "
+              f"({recall_hits}/{recall_total} curated links)")
+
+
+def perturb(name, rng):
+    words = name.split()
+    choice = rng.random()
+    if choice < 0.3:
+        return name.lower()
+    if choice < 0.6:
+        return f"{name} {rng.choice(['process', 'examples', 'in practice', 'overview'])}"
+    if choice < 0.8 and len(words) > 1:
+        return ' '.join(words[:-1])
+    return rng.choice(['blockchain', 'jazz history', 'origami', 'quantum computing',
+                       'stock market', 'renewable energy policy', 'machine learning ethics'])
+
+
+def benchmark(library, engine, queries, seed):
+    rng = random.Random(seed)
+    topics = [perturb(r['topic'], rng) for r in rng.choices(library.records, k=queries)]
+    for topic in topics[:50]:
+        engine.analyze(topic)
+
+    latencies = []
+    for topic in topics:
+        start = time.perf_counter()
+        engine.analyze(topic)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(p / 100.0 * len(latencies)))] * 1000
+
+    print(f"analyze() over {queries} mixed queries: p50 {pct(50):.3f} ms  p95 {pct(95):.3f} ms  "
+          f"p99 {pct(99):.3f} ms  throughput {queries / sum(latencies):,.0f}/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--queries', type=int, default=5000)
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if not NUMPY_AVAILABLE:
+        sys.exit("numpy is required for the insight engine evaluation")
+
+    library = ContentLibrary()
+    start = time.perf_counter()
+    engine = InsightEngine(library, k=args.k)
+    print(f"Built index for {len(engine.names)} topics in {(time.perf_counter() - start) * 1000:.0f} ms "
+          f"({engine.nbytes() / 1024:.0f} KiB)")
+
+    evaluate(library, engine, args.k)
+    benchmark(library, engine, args.queries, args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,292 @@
+"""Cascading schema, bounded background deletion and orphan cleanup.
+
+Clearing a heavy user's concepts or chat used to be one big DELETE that held
+SQLite's database-wide write lock for its whole duration, stalling every
+other user's writes. Clearing is now two steps:
+
+1. The route records a per-user *clear watermark* (the highest row id being
+   cleared) in ``clear_watermarks`` and returns immediately. Reads only show
+   rows above the watermark, so the data disappears for the user at once.
+2. A single background worker deletes the rows at or below the watermark in
+   small batches, one short transaction each, pausing between batches so
+   other writers get the lock.
+
+Watermarks are durable and stay after the rows are gone, since they also
+hide rows archived before the clear. Each one records how far deletion has
+got (``deleted_id``), so only unfinished deletions resume after a restart.
+The same worker periodically removes orphaned rows (activities without a
+concept, concepts and chat rows without a user) in batches. Foreign keys are
+declared ``ON DELETE CASCADE`` and enforced (``PRAGMA foreign_keys = ON`` in
+``get_db``) as the safety net for any other delete path.
+"""
+import queue
+import threading
+import time
+
+# Child table -> (foreign key column, parent table), all ON DELETE CASCADE
+CASCADES = {
+    'concepts': ('user_id', 'users'),
+    'activities': ('concept_id', 'concepts'),
+    'chat_history': ('user_id', 'users'),
+}
+
+# Tables a clear covers, with the child table emptied first so that every
+# batch stays bounded instead of cascading an unknown number of rows
+CLEAR_CHILDREN = {
+    'concepts': ('activities', 'concept_id'),
+    'chat_history': None,
+}
+
+
+def init_schema(cursor):
+    cursor.execute('''CREATE TABLE IF NOT EXISTS clear_watermarks
+                      (user_id INTEGER NOT NULL,
+                       table_name TEXT NOT NULL,
+                       max_id INTEGER NOT NULL,
+                       deleted_id INTEGER NOT NULL DEFAULT 0,
+                       PRIMARY KEY (user_id, table_name))''')
+    # Tables from before deletion progress was tracked: each clear is
+    # resumed once more, then recorded as done
+    columns = [row[1] for row in cursor.execute('PRAGMA table_info(clear_watermarks)')]
+    if 'deleted_id' not in columns:
+        cursor.execute('ALTER TABLE clear_watermarks ADD COLUMN deleted_id INTEGER NOT NULL DEFAULT 0')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_activities_concept ON activities (concept_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_chat_history_user_created ON chat_history (user_id, created_at)')
+
+
+def tables_without_cascade(cursor):
+    """Tables whose foreign key predates ON DELETE CASCADE"""
+    legacy = []
+    for table, (column, parent) in CASCADES.items():
+        for fk in cursor.execute(f'PRAGMA foreign_key_list({table})').fetchall():
+            # (id, seq, table, from, to, on_update, on_delete, match)
+            if fk[3] == column and fk[6].upper() != 'CASCADE':
+                legacy.append(table)
+                break
+    return legacy
+
+
+def legacy_leftovers(cursor):
+    """Tables an interrupted migration renamed but never copied back"""
+    names = {row[0] for row in cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    return [table for table in CASCADES if f'{table}_legacy' in names]
+
+
+def rename_legacy_tables(cursor):
+    """Step 1 of the cascade migration: move old tables out of the way.
+
+    Call inside the caller's transaction, on a connection with foreign keys
+    off (the default), before the CREATE TABLE IF NOT EXISTS statements; then
+    call copy_legacy_tables() once the new tables exist and commit. Returns
+    the tables to copy, including any ``*_legacy`` leftovers of a migration
+    that was interrupted before it copied them.
+    """
+    leftovers = legacy_leftovers(cursor)
+    legacy = [table for table in tables_without_cascade(cursor) if table not in leftovers]
+    if legacy:
+        # Keep other tables' REFERENCES pointing at the new tables
+        cursor.execute('PRAGMA legacy_alter_table = ON')
+        for table in legacy:
+            cursor.execute(f'ALTER TABLE {table} RENAME TO {table}_legacy')
+        cursor.execute('PRAGMA legacy_alter_table = OFF')
+        print(f"✓ Migrating {', '.join(legacy)} to ON DELETE CASCADE")
+    if leftovers:
+        print(f"✓ Resuming interrupted migration of {', '.join(leftovers)}")
+    return leftovers + legacy
+
+
+def copy_legacy_tables(cursor, legacy):
+    """Step 2 of the cascade migration: copy rows that still have a parent"""
+    # Parents first so children can be checked against the copied rows
+    for table in [t for t in CASCADES if t in legacy]:
+        column, parent = CASCADES[table]
+        columns = ', '.join(row[1] for row in cursor.execute(f'PRAGMA table_info({table}_legacy)'))
+        cursor.execute(f'''INSERT INTO {table} ({columns}) SELECT {columns} FROM {table}_legacy
+                           WHERE {column} IS NULL OR {column} IN (SELECT id FROM {parent})''')
+        copied = cursor.rowcount
+        dropped = cursor.execute(f'SELECT COUNT(*) FROM {table}_legacy').fetchone()[0] - copied
+        cursor.execute(f'DROP TABLE {table}_legacy')
+        if dropped:
+            print(f"✓ Dropped {dropped} orphaned {table} rows during migration")
+
+
+def not_cleared(table):
+    """SQL condition hiding rows the user has cleared; binds one more user_id"""
+    return (f"{table}.id > COALESCE((SELECT max_id FROM clear_watermarks "
+            f"WHERE user_id = ? AND table_name = '{table}'), 0)")
+
+
+def mark_cleared(conn, user_id, table, floor=0):
+    """Hide every current row of `table` for the user; returns the watermark.
+
+    `floor` raises the watermark to cover rows kept elsewhere (the archive).
+    """
+    max_id = conn.execute(f'SELECT MAX(COALESCE(MAX(id), 0), ?) FROM {table} WHERE user_id = ?',
+                          (floor, user_id)).fetchone()[0]
+    conn.execute('''INSERT INTO clear_watermarks (user_id, table_name, max_id) VALUES (?, ?, ?)
+                    ON CONFLICT (user_id, table_name) DO UPDATE SET max_id = MAX(max_id, excluded.max_id)''',
+                 (user_id, table, max_id))
+    conn.commit()
+    return max_id
+
+
+def mark_deleted(connect, user_id, table, max_id):
+    """Record that the user's rows of `table` up to `max_id` are deleted"""
+    conn = connect()
+    try:
+        conn.execute('''UPDATE clear_watermarks SET deleted_id = MAX(deleted_id, ?)
+                        WHERE user_id = ? AND table_name = ?''', (max_id, user_id, table))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def delete_batches(connect, table, select_ids, args, batch_size=500, pause=0.01, on_batch=None):
+    """Delete rows whose ids `select_ids` returns, one short transaction per batch"""
+    total = 0
+    while True:
+        conn = connect()
+        try:
+            start = time.perf_counter()
+            ids = [row[0] for row in conn.execute(select_ids, tuple(args) + (batch_size,))]
+            if ids:
+                placeholders = ','.join('?' * len(ids))
+                conn.execute(f'DELETE FROM {table} WHERE id IN ({placeholders})', ids)
+                conn.commit()
+            if on_batch is not None and ids:
+                on_batch(len(ids), time.perf_counter() - start)
+        finally:
+            conn.close()
+        total += len(ids)
+        if len(ids) < batch_size:
+            return total
+        time.sleep(pause)
+
+
+def clear_user_rows(connect, user_id, table, max_id, batch_size=500, **kwargs):
+    """Delete a user's cleared rows at or below the watermark, in batches"""
+    total = 0
+    child = CLEAR_CHILDREN[table]
+    while True:
+        # No ORDER BY: the (user_id, created_at) index yields the oldest rows
+        # first, so each batch only reads rows it is about to delete
+        conn = connect()
+        try:
+            ids = [row[0] for row in conn.execute(
+                f'SELECT id FROM {table} WHERE user_id = ? AND id <= ? LIMIT ?',
+                (user_id, max_id, batch_size))]
+        finally:
+            conn.close()
+        if not ids:
+            return total
+        placeholders = ','.join('?' * len(ids))
+        if child:
+            child_table, column = child
+            total += delete_batches(connect, child_table,
+                                    f'SELECT id FROM {child_table} WHERE {column} IN ({placeholders}) LIMIT ?',
+                                    ids, batch_size=batch_size, **kwargs)
+        total += delete_batches(connect, table, f'SELECT id FROM {table} WHERE id IN ({placeholders}) LIMIT ?',
+                                ids, batch_size=batch_size, **kwargs)
+
+
+def cleanup_orphans(connect, batch_size=500, window=5000, **kwargs):
+    """Remove rows whose parent row no longer exists; returns rows deleted per table.
+
+    Tables are scanned in id windows so no single read holds the database for
+    long (a long read would keep writers from committing).
+    """
+    deleted = {}
+    for table, (column, parent) in CASCADES.items():
+        conn = connect()
+        try:
+            max_id = conn.execute(f'SELECT COALESCE(MAX(id), 0) FROM {table}').fetchone()[0]
+        finally:
+            conn.close()
+        deleted[table] = 0
+        for low in range(0, max_id, window):
+            deleted[table] += delete_batches(
+                connect, table,
+                f'''SELECT id FROM {table} WHERE id > ? AND id <= ? AND {column} IS NOT NULL
+                     AND {column} NOT IN (SELECT id FROM {parent}) LIMIT ?''',
+                (low, low + window), batch_size=batch_size, **kwargs)
+    return deleted
+
+
+class BackgroundDeleter:
+    """Single low-priority worker for clears and periodic orphan cleanup.
+
+    With an `archive` (see retention.py), clears also cover archived rows.
+    """
+
+    def __init__(self, connect, batch_size=500, pause=0.01, orphan_interval=3600, archive=None):
+        self.connect = connect
+        self.archive = archive
+        self.batch_size = batch_size
+        self.pause = pause
+        self.orphan_interval = orphan_interval
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+        self._last_orphan_sweep = 0.0
+
+    def start(self, resume=True):
+        """Start the worker; with `resume`, re-queue clears a restart left unfinished"""
+        if resume:
+            conn = self.connect()
+            try:
+                pending = conn.execute('''SELECT user_id, table_name, max_id FROM clear_watermarks
+                                          WHERE max_id > deleted_id''').fetchall()
+            finally:
+                conn.close()
+            for user_id, table, max_id in pending:
+                self._queue.put((user_id, table, max_id))
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='mindlab-deleter', daemon=True)
+                self._worker.start()
+
+    def clear(self, user_id, table):
+        """Hide the user's rows now and delete them in the background"""
+        conn = self.connect()
+        try:
+            floor = 0
+            if self.archive is not None:
+                # Hold the write lock so no rows move to the archive in between
+                conn.execute('BEGIN IMMEDIATE')
+                floor = self.archive.max_ref(user_id, table)
+            max_id = mark_cleared(conn, user_id, table, floor)
+        finally:
+            conn.close()
+        self._queue.put((user_id, table, max_id))
+        self.start(resume=False)
+
+    def _run(self):
+        while True:
+            timeout = None
+            if self.orphan_interval:
+                timeout = max(0.0, self._last_orphan_sweep + self.orphan_interval - time.monotonic())
+            try:
+                user_id, table, max_id = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                self._sweep_orphans()
+                continue
+            try:
+                clear_user_rows(self.connect, user_id, table, max_id,
+                                batch_size=self.batch_size, pause=self.pause)
+                if self.archive is not None:
+                    self.archive.clear(user_id, table, max_id)
+                mark_deleted(self.connect, user_id, table, max_id)
+            except Exception as e:
+                print(f"⚠ Warning: background clear of {table} for user {user_id} failed: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _sweep_orphans(self):
+        self._last_orphan_sweep = time.monotonic()
+        try:
+            deleted = cleanup_orphans(self.connect, batch_size=self.batch_size, pause=self.pause)
+        except Exception as e:
+            print(f"⚠ Warning: orphan cleanup failed: {e}")
+            return
+        if any(deleted.values()):
+            print(f"✓ Orphan cleanup removed {deleted}")
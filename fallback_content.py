@@ -0,0 +1,291 @@
+"""Offline fallback content library.
+
+Curated topic records live as JSON files under ``data/content`` (override with
+MINDLAB_CONTENT_DIR). Every file is loaded once at import time and indexed by
+normalized topic name and aliases, so the ``generate_*`` helpers in app.py can
+serve real content when Gemini is unavailable. New topics are added by
+dropping another JSON file into the directory - no code changes needed.
+
+Topic file format::
+
+    {
+        "subject": "Biology",
+        "topics": [
+            {
+                "topic": "Photosynthesis",
+                "aliases": ["photosynthetic process"],
+                "difficulty": "basic",
+                "summary": "...",
+                "explanation": "...",
+                "patterns": ["...", "...", "...", "..."],
+                "related": ["...", "...", "...", "...", "..."],
+                "categories": {"Reactants": ["Water", "Carbon Dioxide"], ...},
+                "steps": ["first", "second", "..."],
+                "cloze": "Plants turn [carbon dioxide] and [water] into [glucose].",
+                "cards": [["Question", "Answer"], ...],
+                "quiz": [["Question", ["A", "B", "C", "D"], 1], ...]
+            }
+        ]
+    }
+
+``quiz`` is optional; without it the quiz is built from the flashcards, using
+the other cards' distinct answers as distractors (a question is left out if
+no distractor remains). Cards that share an answer therefore make weaker
+questions, so such records should carry their own ``quiz``. Files whose name starts with an
+underscore hold templates (``_default.json`` is used for unknown topics and
+for the chatbot's keyword replies).
+"""
+import copy
+import json
+import os
+import re
+
+CONTENT_DIR = os.getenv('MINDLAB_CONTENT_DIR',
+                        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'content'))
+
+ACTIVITY_TYPES = ('drag_drop', 'reorder', 'fill_blanks', 'flashcards', 'quiz', 'concept_flow', 'insights')
+
+_NON_ALNUM = re.compile(r'[^a-z0-9]+')
+_CLOZE_BLANK = re.compile(r'\[([^\]]+)\]')
+_LEADING_ARTICLE = re.compile(r'^(the|a|an) ')
+
+
+def normalize_topic(topic):
+    """Normalize a topic name for lookups: lowercase, punctuation-free, single spaced"""
+    return _NON_ALNUM.sub(' ', (topic or '').lower()).strip()
+
+
+def _key_variants(key):
+    """Lookup keys to try for a normalized topic, most specific first"""
+    yield key
+    stripped = _LEADING_ARTICLE.sub('', key)
+    if stripped != key:
+        yield stripped
+    for candidate in (key, stripped):
+        if candidate.endswith('s') and len(candidate) > 3:
+            yield candidate[:-1]
+
+
+def _fill_topic(template, topic):
+    """Substitute {topic} throughout a nested template structure"""
+    if isinstance(template, str):
+        return template.replace('{topic}', topic)
+    if isinstance(template, list):
+        return [_fill_topic(item, topic) for item in template]
+    if isinstance(template, dict):
+        return {_fill_topic(k, topic): _fill_topic(v, topic) for k, v in template.items()}
+    return template
+
+
+def _rotate(items, seed):
+    """Deterministic reordering so the same topic always yields the same layout"""
+    if not items:
+        return list(items)
+    shift = seed % len(items)
+    return list(items[shift:]) + list(items[:shift])
+
+
+def _build_payloads(record):
+    """Expand one curated topic record into every activity payload"""
+    name = record['topic']
+    seed = sum(ord(ch) for ch in name)
+    payloads = {}
+
+    categories = record['categories']
+    mapping = {}
+    for target, items in categories.items():
+        for item in items:
+            mapping[item] = target
+    payloads['drag_drop'] = {
+        'title': f'{name} - Sort the Key Terms',
+        'items': _rotate(list(mapping), seed),
+        'targets': list(categories),
+        'correct_mapping': mapping
+    }
+
+    steps = record['steps']
+    payloads['reorder'] = {
+        'title': f'Order the {name} Steps',
+        'steps': list(steps)
+    }
+    payloads['concept_flow'] = {
+        'title': f'{name} Process Flow',
+        'steps': [{'id': i, 'text': text} for i, text in enumerate(steps, start=1)],
+        'correct_flow': list(range(1, len(steps) + 1))
+    }
+
+    blanks = []
+
+    def _number_blank(match):
+        blanks.append(match.group(1))
+        return f'__{len(blanks)}__'
+
+    payloads['fill_blanks'] = {
+        'title': f'Complete the {name} Description',
+        'text': _CLOZE_BLANK.sub(_number_blank, record['cloze']),
+        'blanks': blanks
+    }
+
+    cards = record['cards']
+    payloads['flashcards'] = [{'front': front, 'back': back} for front, back in cards]
+
+    if record.get('quiz'):
+        questions = [{'question': q, 'options': list(options), 'correct': correct}
+                     for q, options, correct in record['quiz']]
+    else:
+        answers = [back for _, back in cards]
+        questions = []
+        for i, (front, back) in enumerate(cards):
+            # Another card's copy of the right answer would be graded wrong
+            distractors = list(dict.fromkeys(a for a in answers if a != back))[:3]
+            if not distractors:
+                continue
+            options = _rotate([back] + distractors, seed + i)
+            questions.append({'question': front, 'options': options, 'correct': options.index(back)})
+    payloads['quiz'] = {'title': f'{name} Quiz', 'questions': questions}
+
+    payloads['insights'] = {
+        'summary': record['summary'],
+        'patterns': list(record['patterns']),
+        'difficulty': record.get('difficulty', 'intermediate'),
+        'explanation': record['explanation'],
+        'related_topics': list(record['related'])
+    }
+    return payloads
+
+
+def _index_name(index, name, position, records):
+    """Map a topic name or alias to a record, warning when it already maps to another"""
+    key = normalize_topic(name)
+    owner = index.setdefault(key, position)
+    if owner != position:
+        print(f"⚠ Warning: fallback alias {name!r} of {records[position]['topic']!r} already belongs to "
+              f"{records[owner]['topic']!r}; ignored")
+
+
+class ContentLibrary:
+    """In-memory index of curated fallback content, keyed by normalized topic"""
+
+    def __init__(self, content_dir=CONTENT_DIR):
+        self.content_dir = content_dir
+        self.records = []
+        self.payloads = []
+        self.index = {}
+        self.defaults = {}
+        self.load()
+
+    def load(self):
+        """(Re)load every JSON file in the content directory"""
+        records, payloads, index, defaults = [], [], {}, {}
+        if os.path.isdir(self.content_dir):
+            for filename in sorted(os.listdir(self.content_dir)):
+                if not filename.endswith('.json'):
+                    continue
+                path = os.path.join(self.content_dir, filename)
+                try:
+                    with open(path, encoding='utf-8') as f:
+                        data = json.load(f)
+                except (OSError, ValueError) as e:
+                    print(f"⚠ Warning: could not load fallback content {filename}: {e}")
+                    continue
+
+                if filename.startswith('_'):
+                    defaults.update(data)
+                    continue
+
+                subject = data.get('subject', '')
+                for record in data.get('topics', []):
+                    try:
+                        record_payloads = _build_payloads(record)
+                    except (KeyError, TypeError, ValueError) as e:
+                        print(f"⚠ Warning: skipping fallback topic {record.get('topic')!r} in {filename}: {e}")
+                        continue
+                    for question in record_payloads['quiz']['questions']:
+                        if len(set(question['options'])) < len(question['options']):
+                            print(f"⚠ Warning: fallback topic {record['topic']!r} has duplicate quiz options "
+                                  f"in {question['question']!r}")
+                    record.setdefault('subject', subject)
+                    records.append(record)
+                    payloads.append(record_payloads)
+
+        # Topic names first, so an alias can never shadow another topic's name
+        for position, record in enumerate(records):
+            _index_name(index, record['topic'], position, records)
+        for position, record in enumerate(records):
+            for alias in record.get('aliases', []):
+                _index_name(index, alias, position, records)
+
+        self.records, self.payloads, self.index, self.defaults = records, payloads, index, defaults
+
+    def __len__(self):
+        return len(self.records)
+
+    def __contains__(self, topic):
+        return self._position(topic) is not None
+
+    def _position(self, topic):
+        key = normalize_topic(topic)
+        for variant in _key_variants(key):
+            if variant in self.index:
+                return self.index[variant]
+        return None
+
+    def lookup(self, topic):
+        """Return the curated record for a topic, or None"""
+        position = self._position(topic)
+        return self.records[position] if position is not None else None
+
+    def get(self, topic, activity_type):
+        """Return the fallback payload of one activity type for a topic"""
+        position = self._position(topic)
+        if position is not None:
+            return copy.deepcopy(self.payloads[position][activity_type])
+        return self.default_payload(topic, activity_type)
+
+    def default_payload(self, topic, activity_type):
+        """The generic template payload of one activity type, filled in for a topic"""
+        return _fill_topic(self.defaults.get(activity_type, {}), topic)
+
+    def guess_difficulty(self, topic):
+        """Difficulty for a topic: curated value, else keyword match, else intermediate"""
+        record = self.lookup(topic)
+        if record:
+            return record.get('difficulty', 'intermediate')
+        topic_lower = (topic or '').lower()
+        for level, keywords in self.defaults.get('difficulty_keywords', {}).items():
+            if any(kw in topic_lower for kw in keywords):
+                return level
+        return 'intermediate'
+
+    def find_in_text(self, text, max_words=4):
+        """Return the record of the longest curated topic mentioned in free text"""
+        words = normalize_topic(text).split()
+        for size in range(min(max_words, len(words)), 0, -1):
+            for start in range(len(words) - size + 1):
+                phrase = ' '.join(words[start:start + size])
+                if len(phrase) < 3:
+                    continue
+                position = self._position(phrase)
+                if position is not None:
+                    return self.records[position]
+        return None
+
+    def chatbot_reply(self, message):
+        """Keyword-based chatbot reply, preferring curated topic summaries"""
+        record = self.find_in_text(message)
+        if record:
+            return (f"{record['summary']} Would you like to learn more about it "
+                    f"in the Concept Playground?")
+
+        chatbot = self.defaults.get('chatbot', {})
+        message_lower = message.lower()
+        for keyword, response in chatbot.get('keywords', []):
+            if keyword in message_lower:
+                return response
+        return None
+
+    def chatbot_default_responses(self):
+        return list(self.defaults.get('chatbot', {}).get('default', []))
+
+
+library = ContentLibrary()
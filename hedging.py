@@ -0,0 +1,197 @@
+"""Hedged requests across a list of fallback models.
+
+A plain fallback chain only moves to the next model after the current one
+raises, so a slow-but-successful primary call sets the tail latency. The
+HedgedCaller starts the primary model and, if it has not answered within a
+percentile of that model's recent latency, fires the same request at the
+next model. Whichever succeeds first wins; the loser is cancelled if it has
+not started yet and otherwise ignored (the Gemini SDK has no way to abort an
+in-flight request). Errors still fail over down the list like before.
+
+Hedges cost an extra call, so they are capped to a share of recent calls
+and can be made to draw from an external budget (``acquire``). The primary
+call (and any failover) runs on its own thread as soon as it is made, so
+turning hedging on never queues normal calls; only hedges use the bounded
+worker pool, and no hedge is sent while every worker is busy.
+"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies per model"""
+
+    def __init__(self, window=200):
+        self.window = window
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, model, seconds):
+        with self._lock:
+            self._samples.setdefault(model, deque(maxlen=self.window)).append(seconds)
+
+    def count(self, model):
+        with self._lock:
+            return len(self._samples.get(model, ()))
+
+    def percentile(self, model, pct):
+        with self._lock:
+            samples = sorted(self._samples.get(model, ()))
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(round(pct / 100.0 * (len(samples) - 1))))
+        return samples[index]
+
+
+class HedgedCaller:
+    """Call `call(model, *args, **kwargs)` over `models`, hedging slow calls"""
+
+    def __init__(self, call, models, percentile=95, max_hedge_rate=0.1, min_samples=20,
+                 default_delay=2.0, window=200, max_workers=8, acquire=None):
+        self.call = call
+        self.models = list(models)
+        self.percentile = percentile
+        self.max_hedge_rate = max_hedge_rate
+        self.min_samples = min_samples
+        self.default_delay = default_delay
+        self.acquire = acquire
+        self.max_workers = max_workers
+        self.latency = LatencyTracker(window)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='mindlab-hedge')
+        self._recent_calls = deque(maxlen=window)
+        self._recent_hedges = deque()
+        self._inflight = 0
+        self._lock = threading.Lock()
+        self.stats = {'calls': 0, 'hedges': 0, 'hedge_wins': 0, 'hedges_capped': 0,
+                      'hedges_saturated': 0, 'failovers': 0}
+
+    def hedge_delay(self, model):
+        """Seconds to wait on `model` before hedging"""
+        if self.latency.count(model) < self.min_samples:
+            return self.default_delay
+        return self.latency.percentile(model, self.percentile)
+
+    def _allow_hedge(self):
+        with self._lock:
+            if self._inflight >= self.max_workers:
+                # Pool saturated: the hedge would only wait for a worker
+                self.stats['hedges_saturated'] += 1
+                return False
+            oldest = self._recent_calls[0] if self._recent_calls else 0
+            while self._recent_hedges and self._recent_hedges[0] < oldest:
+                self._recent_hedges.popleft()
+            if len(self._recent_hedges) + 1 > self.max_hedge_rate * len(self._recent_calls):
+                self.stats['hedges_capped'] += 1
+                return False
+        if self.acquire is not None and not self.acquire():
+            with self._lock:
+                self.stats['hedges_capped'] += 1
+            return False
+        with self._lock:
+            self._recent_hedges.append(time.monotonic())
+            self.stats['hedges'] += 1
+        return True
+
+    def _timed(self, job, args, kwargs):
+        job['started'] = time.monotonic()
+        try:
+            result = self.call(job['model'], *args, **kwargs)
+            self.latency.record(job['model'], time.monotonic() - job['started'])
+            return result
+        finally:
+            if job['hedge']:
+                with self._lock:
+                    self._inflight -= 1
+
+    def _spawn(self, job, args, kwargs):
+        """Run a primary or failover call on a thread of its own, never queued"""
+        future = Future()
+
+        def run():
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                future.set_result(self._timed(job, args, kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+
+        threading.Thread(target=run, name='mindlab-gemini-call', daemon=True).start()
+        return future
+
+    def __call__(self, *args, **kwargs):
+        with self._lock:
+            self._recent_calls.append(time.monotonic())
+            self.stats['calls'] += 1
+
+        remaining = list(self.models)
+        pending = {}
+        hedged = False
+        last_error = None
+
+        def launch(hedge=False):
+            # 'started' is set once the call actually runs
+            job = {'model': remaining.pop(0), 'started': None, 'hedge': hedge}
+            if hedge:
+                with self._lock:
+                    self._inflight += 1
+                pending[self._executor.submit(self._timed, job, args, kwargs)] = job
+            else:
+                pending[self._spawn(job, args, kwargs)] = job
+
+        launch()
+        while pending:
+            timeout = None
+            job = None
+            if not hedged and remaining and len(pending) == 1:
+                job, = pending.values()
+                delay = self.hedge_delay(job['model'])
+                if job['started'] is None:
+                    # Still queued: check again once it could have run for `delay`
+                    timeout = delay
+                else:
+                    timeout = max(0.0, delay - (time.monotonic() - job['started']))
+
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                started = job['started']
+                if started is None or time.monotonic() - started < delay:
+                    continue
+                # Slower than usual: race the next model, at most once per call
+                hedged = True
+                if self._allow_hedge():
+                    launch(hedge=True)
+                continue
+
+            for future in done:
+                model = pending.pop(future)['model']
+                try:
+                    result = future.result()
+                except Exception as e:
+                    last_error = e
+                    continue
+                for loser, job in pending.items():
+                    if loser.cancel() and job['hedge']:
+                        # Never ran, so _timed will not release its slot
+                        with self._lock:
+                            self._inflight -= 1
+                if hedged and model != self.models[0]:
+                    with self._lock:
+                        self.stats['hedge_wins'] += 1
+                return result
+
+            if not pending and remaining:
+                with self._lock:
+                    self.stats['failovers'] += 1
+                launch()
+
+        raise last_error
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+        stats['hedge_rate'] = stats['hedges'] / stats['calls'] if stats['calls'] else 0.0
+        stats['max_workers'] = self.max_workers
+        stats['hedge_delay'] = {model: self.hedge_delay(model) for model in self.models}
+        return stats
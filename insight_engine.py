@@ -0,0 +1,196 @@
+"""Local, model-free insight engine.
+
+Every curated topic in the content library is turned into two hashed
+character n-gram TF-IDF vectors - one for its name and aliases, one for its
+full text (summary, explanation, patterns, steps, flashcards) - and stored as
+compact float32 NumPy matrices of 2048 hashed features per row. A query topic
+is vectorized the same way and matched against all topics with one
+matrix-vector product per matrix, which gives:
+
+- related topics: the nearest curated topics,
+- patterns and a short summary drawn from those neighbours.
+
+No difficulty classifier ships. Known topics and close variants of their
+names keep their curated label; any other topic gets the keyword rule (else
+intermediate), the same as before the engine existed. Neither a vote of the
+nearest topics' labels nor a linear model over these vectors beat the
+majority class on held-out topics (see benchmarks/eval_insight_engine.py).
+The engine therefore reports zero confidence for such topics.
+
+Answers take well under a millisecond per topic, so the engine can stand in
+for Gemini as a fast path for curated topics and their close variants and as
+the fallback for everything else. NumPy is optional; without it the engine only
+serves curated topics and keyword-based difficulty.
+"""
+import zlib
+from collections import Counter
+
+from fallback_content import normalize_topic
+
+NUMPY_AVAILABLE = False
+np = None
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    print("⚠ Warning: numpy not installed. Local insight engine limited to curated topics. Install with: pip install numpy")
+
+def _ngrams(text, ngram_range=(3, 5)):
+    """Character n-grams of each word (padded with spaces) plus the words themselves"""
+    grams = []
+    low, high = ngram_range
+    for word in normalize_topic(text).split():
+        grams.append(word)
+        padded = f' {word} '
+        for n in range(low, high + 1):
+            grams.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+    return grams
+
+
+def _record_text(record):
+    parts = [record['topic'], record['summary'], record['explanation']]
+    parts += record.get('aliases', [])
+    parts += record['patterns']
+    parts += record['steps']
+    parts += list(record['categories'])
+    for items in record['categories'].values():
+        parts += items
+    parts += [front for front, _ in record['cards']]
+    return ' '.join(parts)
+
+
+class InsightEngine:
+    """Nearest-neighbour topic analysis over the curated content library"""
+
+    def __init__(self, library, dim=2048, ngram_range=(3, 5), name_weight=0.2,
+                 match_threshold=0.8, min_score=0.15, k=5):
+        self.library = library
+        self.dim = dim
+        self.ngram_range = ngram_range
+        self.name_weight = name_weight
+        self.match_threshold = match_threshold
+        self.min_score = min_score
+        self.k = k
+        self.names = []
+        self.name_vectors = None
+        self.doc_vectors = None
+        if NUMPY_AVAILABLE:
+            self.build()
+
+    @property
+    def ready(self):
+        return self.name_vectors is not None and len(self.names) > 0
+
+    def _hash(self, grams):
+        # crc32 rather than hash() so vectors are stable across processes
+        return np.fromiter((zlib.crc32(g.encode('utf-8')) & (self.dim - 1) for g in grams),
+                           dtype=np.int64, count=len(grams))
+
+    def _term_counts(self, texts):
+        counts = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            grams = _ngrams(text, self.ngram_range)
+            if grams:
+                counts[row] = np.bincount(self._hash(grams), minlength=self.dim)
+        return counts
+
+    @staticmethod
+    def _tfidf(counts, idf):
+        weights = np.log1p(counts) * idf
+        norms = np.linalg.norm(weights, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return weights / norms
+
+    @staticmethod
+    def _idf(counts):
+        df = np.count_nonzero(counts, axis=0)
+        return (np.log((1.0 + len(counts)) / (1.0 + df)) + 1.0).astype(np.float32)
+
+    def build(self):
+        """(Re)build the topic matrices from the content library"""
+        records = self.library.records
+        self.names = [record['topic'] for record in records]
+        name_counts = self._term_counts([' '.join([r['topic']] + r.get('aliases', [])) for r in records])
+        doc_counts = self._term_counts([_record_text(r) for r in records])
+        self.name_idf = self._idf(name_counts)
+        self.doc_idf = self._idf(doc_counts)
+        self.name_vectors = self._tfidf(name_counts, self.name_idf)
+        self.doc_vectors = self._tfidf(doc_counts, self.doc_idf)
+
+    def nbytes(self):
+        if not self.ready:
+            return 0
+        return sum(a.nbytes for a in (self.name_vectors, self.doc_vectors, self.name_idf,
+                                      self.doc_idf))
+
+    def similarities(self, topic):
+        """Name and full-text cosine similarity of a topic against every curated topic"""
+        counts = self._term_counts([topic])[0]
+        name_sim = self.name_vectors @ self._tfidf(counts, self.name_idf)
+        doc_sim = self.doc_vectors @ self._tfidf(counts, self.doc_idf)
+        return name_sim, doc_sim
+
+    def _top(self, name_sim, doc_sim, k, exclude=()):
+        scores = self.name_weight * name_sim + (1.0 - self.name_weight) * doc_sim
+        for position in exclude:
+            scores[position] = -1.0
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(i), float(scores[i])) for i in top if scores[i] >= self.min_score]
+
+    def neighbours(self, topic, k=None, exclude=()):
+        """Top-k (position, score) of curated topics closest to `topic`"""
+        if not self.ready:
+            return []
+        return self._top(*self.similarities(topic), k or self.k, exclude)
+
+    def analyze(self, topic):
+        """Return (insights, confidence) for a topic; confidence is in [0, 1].
+
+        Only curated topics and close variants of their names get a non-zero
+        confidence; for anything else the insights are a best-effort fallback.
+        """
+        if topic in self.library:
+            return self.library.get(topic, 'insights'), 1.0
+        if not self.ready:
+            insights = self.library.get(topic, 'insights')
+            insights['difficulty'] = self.library.guess_difficulty(topic)
+            return insights, 0.0
+
+        name_sim, doc_sim = self.similarities(topic)
+        best = int(np.argmax(name_sim))
+        if name_sim[best] >= self.match_threshold:
+            # A close variant of a curated topic name, e.g. "photosynthesis process"
+            return self.library.get(self.names[best], 'insights'), float(name_sim[best])
+
+        neighbours = self._top(name_sim, doc_sim, self.k)
+        insights = self.library.default_payload(topic, 'insights')
+        insights['difficulty'] = self.library.guess_difficulty(topic)
+        if not neighbours:
+            return insights, 0.0
+
+        related = [self.names[position] for position, _ in neighbours]
+        nearest = self.library.records[neighbours[0][0]]
+        # Pad with the nearest topic's own curated suggestions
+        seen = {normalize_topic(name) for name in related} | {normalize_topic(topic)}
+        for name in nearest['related']:
+            if len(related) >= self.k:
+                break
+            if normalize_topic(name) not in seen:
+                seen.add(normalize_topic(name))
+                related.append(name)
+        subject = nearest.get('subject')
+        if subject:
+            insights['summary'] = (f"{topic} is closely related to {' and '.join(related[:2])} "
+                                   f"in {subject.lower()}.")
+        patterns = Counter()
+        for position, score in neighbours:
+            for pattern in self.library.records[position]['patterns']:
+                patterns[pattern] += score
+        insights['patterns'] = [pattern for pattern, _ in patterns.most_common(4)]
+        insights['related_topics'] = related
+        # Related topics and patterns are borrowed, but nothing curated backs
+        # the difficulty, so 'fast' mode leaves these topics to Gemini
+        return insights, 0.0
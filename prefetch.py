@@ -0,0 +1,246 @@
+"""Activity cache, LLM call budget and speculative prefetch scheduler.
+
+After Pattern Insights are served, the related topics are likely next steps
+for the student. When enabled (MINDLAB_PREFETCH_TOPICS > 0) the scheduler
+generates activity sets for the top N of them on a single low-priority
+background thread so the next playground load is served from the cache.
+
+Prefetching never competes with students: the worker waits while any
+foreground generation is running, and only starts a set when the global LLM
+budget still has its reserve left for foreground calls. ``build(topic)``
+returns ``(activities, complete)``; sets that fell back to curated content
+part-way (budget ran out, model errors) are discarded rather than cached.
+"""
+import queue
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from fallback_content import normalize_topic
+
+
+class ActivityCache:
+    """Thread-safe LRU cache of generated activity sets, keyed by normalized topic"""
+
+    def __init__(self, max_size=256, ttl=3600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_size > 0 and self.ttl > 0
+
+    def get(self, topic):
+        key = normalize_topic(topic)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, topic, value):
+        if not self.enabled:
+            return
+        key = normalize_topic(topic)
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def __contains__(self, topic):
+        return self.get(topic) is not None
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+class LLMBudget:
+    """Global token bucket limiting LLM calls per minute (0 = unlimited)"""
+
+    def __init__(self, calls_per_minute=0):
+        self.capacity = calls_per_minute
+        self._tokens = float(calls_per_minute)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def limited(self):
+        return self.capacity > 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.capacity / 60.0)
+        self._updated = now
+
+    def available(self):
+        if not self.limited:
+            return float('inf')
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+    def try_acquire(self, cost=1):
+        """Take `cost` calls from the budget; False if it is exhausted"""
+        if not self.limited:
+            return True
+        with self._lock:
+            self._refill()
+            if self._tokens < cost:
+                return False
+            self._tokens -= cost
+            return True
+
+
+class PrefetchScheduler:
+    """Background generation of activity sets for likely next topics"""
+
+    def __init__(self, build, cache, budget, top_n=0, set_cost=1, reserve=0.5, max_queue=32):
+        self.build = build
+        self.cache = cache
+        self.budget = budget
+        self.top_n = top_n
+        self.set_cost = set_cost
+        self.reserve = reserve
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._queued = set()
+        self._unclaimed = set()
+        self._foreground = 0
+        self._idle = threading.Condition()
+        self._lock = threading.Lock()
+        self._worker = None
+        self.stats = {
+            'scheduled': 0,
+            'skipped_cached': 0,
+            'skipped_budget': 0,
+            'dropped': 0,
+            'completed': 0,
+            'incomplete': 0,
+            'failed': 0,
+            'requests': 0,
+            'cache_hits': 0,
+            'prefetch_hits': 0,
+        }
+
+    @property
+    def enabled(self):
+        return self.top_n > 0 and self.cache.enabled
+
+    def _bump(self, name, amount=1):
+        with self._lock:
+            self.stats[name] += amount
+
+    def schedule(self, topics):
+        """Queue the top N topics for prefetching, skipping cached and queued ones"""
+        if not self.enabled:
+            return
+        for topic in list(topics)[:self.top_n]:
+            key = normalize_topic(topic)
+            if not key:
+                continue
+            if topic in self.cache:
+                self._bump('skipped_cached')
+                continue
+            with self._lock:
+                if key in self._queued:
+                    continue
+                self._queued.add(key)
+            try:
+                self._queue.put_nowait(topic)
+            except queue.Full:
+                with self._lock:
+                    self._queued.discard(key)
+                self._bump('dropped')
+                continue
+            self._bump('scheduled')
+        self._ensure_worker()
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='mindlab-prefetch', daemon=True)
+                self._worker.start()
+
+    @contextmanager
+    def foreground(self):
+        """Mark a student-facing generation; the prefetch worker yields meanwhile"""
+        with self._idle:
+            self._foreground += 1
+        try:
+            yield
+        finally:
+            with self._idle:
+                self._foreground -= 1
+                self._idle.notify_all()
+
+    def _wait_for_idle(self):
+        with self._idle:
+            while self._foreground:
+                self._idle.wait()
+
+    def _budget_allows(self):
+        # Keep a share of the budget for foreground calls
+        if not self.budget.limited:
+            return True
+        return self.budget.available() >= self.set_cost + self.budget.capacity * self.reserve
+
+    def _run(self):
+        while True:
+            topic = self._queue.get()
+            key = normalize_topic(topic)
+            try:
+                self._wait_for_idle()
+                if topic in self.cache:
+                    self._bump('skipped_cached')
+                elif not self._budget_allows():
+                    self._bump('skipped_budget')
+                else:
+                    activities, complete = self.build(topic)
+                    if complete:
+                        self.cache.put(topic, activities)
+                        with self._lock:
+                            self._unclaimed.add(key)
+                        self._bump('completed')
+                    else:
+                        self._bump('incomplete')
+            except Exception as e:
+                self._bump('failed')
+                print(f"⚠ Warning: prefetch for {topic!r} failed: {e}")
+            finally:
+                with self._lock:
+                    self._queued.discard(key)
+                self._queue.task_done()
+
+    def record_request(self, topic, hit):
+        """Count a playground request; a hit on a not-yet-used prefetch is a prefetch hit"""
+        key = normalize_topic(topic)
+        with self._lock:
+            self.stats['requests'] += 1
+            if hit:
+                self.stats['cache_hits'] += 1
+                if key in self._unclaimed:
+                    self._unclaimed.discard(key)
+                    self.stats['prefetch_hits'] += 1
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+        stats['enabled'] = self.enabled
+        stats['top_n'] = self.top_n
+        stats['queued'] = self._queue.qsize()
+        stats['cached_topics'] = len(self.cache)
+        # Share of completed prefetches that a student actually opened
+        stats['prefetch_hit_rate'] = (stats['prefetch_hits'] / stats['completed']
+                                      if stats['completed'] else 0.0)
+        stats['cache_hit_rate'] = (stats['cache_hits'] / stats['requests']
+                                   if stats['requests'] else 0.0)
+        return stats
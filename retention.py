@@ -0,0 +1,443 @@
+"""Retention: archive old chat history and activities, compact the database.
+
+Full Gemini responses in ``chat_history`` and raw JSON in
+``activities.activity_data`` used to be kept forever and make up most of
+``mindlab.db``. Rows older than ``max_age_days`` are moved into a separate
+archive database (``mindlab_archive.db``) as zlib-compressed *segments*: one
+segment per user and batch, holding that user's rows as JSON. Each segment
+keeps a small uncompressed summary (row count, date range, a preview of the
+first messages or the activity types and average score), so the archived
+tail can be listed without decompressing anything. The rows themselves are
+decompressed on demand when the history API pages past the hot rows.
+
+Rows are moved in small batches on a connection with the archive ATTACHed, so
+the insert into the archive and the delete from the hot table commit in one
+transaction. Rows hidden by a clear watermark are left for the background
+deleter. Both databases use ``auto_vacuum = INCREMENTAL``; after every pass
+the worker hands freed pages back to the filesystem with
+``PRAGMA incremental_vacuum`` in bounded steps.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import Counter
+
+ARCHIVE_PATH = 'mindlab_archive.db'
+
+# Archived table -> batch query and the fields kept per row. Every query
+# yields (id, user_id, ref, timestamp, cleared, *fields) in id order; `ref` is
+# the id a clear watermark is compared with (chat rows are cleared by their
+# own id, activities by their concept's id).
+SOURCES = {
+    'chat_history': {
+        'select': '''SELECT h.id, h.user_id, h.id, h.created_at,
+                            h.id <= COALESCE(w.max_id, 0),
+                            h.message, h.response
+                     FROM chat_history h
+                     LEFT JOIN clear_watermarks w
+                       ON w.user_id = h.user_id AND w.table_name = 'chat_history'
+                     WHERE h.id > ? ORDER BY h.id LIMIT ?''',
+        'fields': ('id', 'created_at', 'message', 'response'),
+    },
+    'activities': {
+        'select': '''SELECT a.id, c.user_id, a.concept_id, a.completed_at,
+                            a.concept_id <= COALESCE(w.max_id, 0),
+                            a.concept_id, c.topic, a.activity_type, a.activity_data, a.score
+                     FROM activities a
+                     JOIN concepts c ON c.id = a.concept_id
+                     LEFT JOIN clear_watermarks w
+                       ON w.user_id = c.user_id AND w.table_name = 'concepts'
+                     WHERE a.id > ? ORDER BY a.id LIMIT ?''',
+        'fields': ('id', 'completed_at', 'concept_id', 'topic', 'activity_type', 'activity_data', 'score'),
+    },
+}
+
+# Cleared table (see deletion.py) -> archived source it also clears
+CLEARS = {
+    'chat_history': 'chat_history',
+    'concepts': 'activities',
+}
+
+INSERT_SEGMENT = '''INSERT INTO {schema}archived_segments
+                    (source, user_id, first_id, last_id, max_ref, first_at, last_at,
+                     row_count, raw_bytes, summary, payload)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'''
+
+
+def enable_incremental_vacuum(conn):
+    """Switch a database to auto_vacuum = INCREMENTAL; returns True if it had to VACUUM.
+
+    Must run outside a transaction. New databases only need the pragma; an
+    existing one is rebuilt once with VACUUM, which can take a while.
+    """
+    if conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2:
+        return False
+    conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+    if conn.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()[0] == 0:
+        return False
+    print("✓ Rebuilding database once for incremental vacuum")
+    conn.execute('VACUUM')
+    return True
+
+
+def incremental_vacuum(connect, step=1000, pause=0.01, schema='main'):
+    """Release free pages to the filesystem, `step` pages per transaction.
+
+    Does nothing unless the database uses auto_vacuum = INCREMENTAL: on other
+    databases the pragma is a no-op and the free pages would never go away.
+    """
+    freed = 0
+    while True:
+        conn = connect()
+        try:
+            if conn.execute(f'PRAGMA {schema}.auto_vacuum').fetchone()[0] != 2:
+                return freed
+            free = conn.execute(f'PRAGMA {schema}.freelist_count').fetchone()[0]
+            if free:
+                # execute() steps the pragma once, which frees a single page;
+                # executescript() runs it to completion
+                conn.executescript(f'PRAGMA {schema}.incremental_vacuum({min(step, free)})')
+        finally:
+            conn.close()
+        freed += min(step, free)
+        if free <= step:
+            return freed
+        time.sleep(pause)
+
+
+def _summarize(source, rows):
+    if source == 'chat_history':
+        return {'preview': [row[2][:80] for row in rows[:3]]}
+    scores = [row[6] for row in rows if row[6] is not None]
+    topics = list(dict.fromkeys(row[3] for row in rows))
+    return {'types': dict(Counter(row[4] for row in rows)),
+            'topics': topics[:5],
+            'avg_score': round(sum(scores) / len(scores), 1) if scores else None}
+
+
+def _segment(source, user_id, values, max_ref):
+    """INSERT_SEGMENT parameters for rows [id, timestamp, *fields] in id order"""
+    payload = json.dumps(values)
+    return (source, user_id, values[0][0], values[-1][0], max_ref, values[0][1], values[-1][1],
+            len(values), len(payload), json.dumps(_summarize(source, values)),
+            zlib.compress(payload.encode('utf-8'), 6))
+
+
+def archive_batch(conn, source, cutoff, after=0, batch_size=500):
+    """Move one batch of rows older than `cutoff` into the attached archive.
+
+    Returns (rows moved, id to continue after, whether old rows remain).
+    """
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        rows = conn.execute(SOURCES[source]['select'], (after, batch_size)).fetchall()
+        segments = {}
+        last_seen = after
+        done = len(rows) < batch_size
+        for row_id, user_id, ref, at, cleared, *fields in rows:
+            if at is not None and at >= cutoff:
+                # Rows are in id order, so everything after this one is newer
+                done = True
+                break
+            last_seen = row_id
+            if not cleared:
+                segments.setdefault(user_id, []).append((row_id, ref, at, *fields))
+
+        moved = []
+        for user_id, items in segments.items():
+            values = [[item[0], item[2], *item[3:]] for item in items]
+            conn.execute(INSERT_SEGMENT.format(schema='archive.'),
+                         _segment(source, user_id, values, max(item[1] for item in items)))
+            moved.extend(item[0] for item in items)
+        if moved:
+            placeholders = ','.join('?' * len(moved))
+            conn.execute(f'DELETE FROM {source} WHERE id IN ({placeholders})', moved)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return len(moved), last_seen, not done
+
+
+class Archive:
+    """Compressed archive database of old chat history and activities"""
+
+    def __init__(self, path=ARCHIVE_PATH):
+        self.path = path
+        # Clears and compaction take turns, so a merge never outlives a clear
+        self._lock = threading.Lock()
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def connect(self):
+        return sqlite3.connect(self.path)
+
+    def attach(self, conn):
+        conn.execute('ATTACH DATABASE ? AS archive', (self.path,))
+        return conn
+
+    def init_schema(self):
+        conn = self.connect()
+        try:
+            enable_incremental_vacuum(conn)
+            conn.execute('''CREATE TABLE IF NOT EXISTS archived_segments
+                            (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                             source TEXT NOT NULL,
+                             user_id INTEGER NOT NULL,
+                             first_id INTEGER NOT NULL,
+                             last_id INTEGER NOT NULL,
+                             max_ref INTEGER NOT NULL,
+                             first_at TIMESTAMP,
+                             last_at TIMESTAMP,
+                             row_count INTEGER NOT NULL,
+                             raw_bytes INTEGER NOT NULL,
+                             summary TEXT,
+                             payload BLOB NOT NULL,
+                             archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+            conn.execute('''CREATE INDEX IF NOT EXISTS idx_archived_segments_user
+                            ON archived_segments (source, user_id, last_id)''')
+            conn.commit()
+        finally:
+            conn.close()
+
+    def max_ref(self, user_id, table):
+        """Highest watermark id among the user's archived rows cleared by `table`"""
+        if not self.exists():
+            return 0
+        conn = self.connect()
+        try:
+            return conn.execute('''SELECT COALESCE(MAX(max_ref), 0) FROM archived_segments
+                                   WHERE source = ? AND user_id = ?''',
+                                (CLEARS[table], user_id)).fetchone()[0]
+        finally:
+            conn.close()
+
+    def clear(self, user_id, table, max_id):
+        """Delete the user's archived segments covered by a clear of `table`"""
+        if not self.exists():
+            return 0
+        with self._lock:
+            conn = self.connect()
+            try:
+                deleted = conn.execute('''DELETE FROM archived_segments
+                                          WHERE source = ? AND user_id = ? AND max_ref <= ?''',
+                                       (CLEARS[table], user_id, max_id)).rowcount
+                conn.commit()
+                return deleted
+            finally:
+                conn.close()
+
+    def compact(self, watermarks=None, min_rows=200):
+        """Merge each user's small segments into ones of at least `min_rows` rows.
+
+        A batch interleaves many users, so fresh segments hold only a few rows
+        each; merging them compresses better and spreads the summary over more
+        rows. Segments at or below a clear watermark ({(user_id, source):
+        max_id}) are left for the deleter. Returns the number of segments merged.
+        """
+        if not self.exists():
+            return 0
+        watermarks = watermarks or {}
+        conn = self.connect()
+        try:
+            owners = conn.execute('''SELECT source, user_id FROM archived_segments WHERE row_count < ?
+                                     GROUP BY source, user_id HAVING COUNT(*) > 1''', (min_rows,)).fetchall()
+        finally:
+            conn.close()
+        merged = 0
+        for source, user_id in owners:
+            with self._lock:
+                conn = self.connect()
+                try:
+                    group, rows = [], 0
+                    for segment_id, count in conn.execute(
+                            '''SELECT id, row_count FROM archived_segments
+                               WHERE source = ? AND user_id = ? AND row_count < ? AND max_ref > ?
+                               ORDER BY last_id''',
+                            (source, user_id, min_rows, watermarks.get((user_id, source), 0))).fetchall():
+                        group.append(segment_id)
+                        rows += count
+                        if rows >= min_rows:
+                            merged += self._merge(conn, source, user_id, group)
+                            group, rows = [], 0
+                    merged += self._merge(conn, source, user_id, group)
+                finally:
+                    conn.close()
+        return merged
+
+    @staticmethod
+    def _merge(conn, source, user_id, segment_ids):
+        if len(segment_ids) < 2:
+            return 0
+        placeholders = ','.join('?' * len(segment_ids))
+        segments = conn.execute(f'SELECT max_ref, payload FROM archived_segments WHERE id IN ({placeholders})',
+                                segment_ids).fetchall()
+        values = sorted((row for _, payload in segments for row in json.loads(zlib.decompress(payload))),
+                        key=lambda row: row[0])
+        conn.execute(INSERT_SEGMENT.format(schema=''),
+                     _segment(source, user_id, values, max(max_ref for max_ref, _ in segments)))
+        conn.execute(f'DELETE FROM archived_segments WHERE id IN ({placeholders})', segment_ids)
+        conn.commit()
+        return len(segment_ids)
+
+    def rows(self, source, user_id, before=None, limit=20, after=0):
+        """Archived rows with after < id < before, newest first, decompressed on demand"""
+        if not self.exists() or limit <= 0:
+            return []
+        fields = SOURCES[source]['fields']
+        before = before if before is not None else 2 ** 63 - 1
+        found = []
+        conn = self.connect()
+        try:
+            segments = conn.execute('''SELECT last_id, payload FROM archived_segments
+                                       WHERE source = ? AND user_id = ? AND first_id < ? AND last_id > ?
+                                       ORDER BY last_id DESC''',
+                                    (source, user_id, before, after))
+            for last_id, payload in segments:
+                # Segments can overlap, so stop only once no older segment can beat the rows found
+                if len(found) >= limit and last_id < found[limit - 1]['id']:
+                    break
+                for values in json.loads(zlib.decompress(payload)):
+                    if after < values[0] < before:
+                        row = dict(zip(fields, values))
+                        row['archived'] = True
+                        found.append(row)
+                found.sort(key=lambda row: row['id'], reverse=True)
+        finally:
+            conn.close()
+        return found[:limit]
+
+    def summaries(self, source, user_id, after=0, limit=50):
+        """The summarized archive tail: one entry per segment, newest first"""
+        if not self.exists():
+            return []
+        conn = self.connect()
+        try:
+            rows = conn.execute('''SELECT first_id, last_id, first_at, last_at, row_count, summary
+                                   FROM archived_segments
+                                   WHERE source = ? AND user_id = ? AND last_id > ?
+                                   ORDER BY last_id DESC LIMIT ?''',
+                                (source, user_id, after, limit)).fetchall()
+        finally:
+            conn.close()
+        return [{'first_id': first_id, 'last_id': last_id, 'first_at': first_at, 'last_at': last_at,
+                 'rows': row_count, **json.loads(summary or '{}')}
+                for first_id, last_id, first_at, last_at, row_count, summary in rows]
+
+    def stats(self):
+        if not self.exists():
+            return {}
+        conn = self.connect()
+        try:
+            rows = conn.execute('''SELECT source, COUNT(*), SUM(row_count), SUM(raw_bytes), SUM(LENGTH(payload))
+                                   FROM archived_segments GROUP BY source''').fetchall()
+        finally:
+            conn.close()
+        return {source: {'segments': segments, 'rows': count, 'raw_bytes': raw, 'compressed_bytes': packed}
+                for source, segments, count, raw, packed in rows}
+
+
+def clear_watermarks(connect):
+    """Current clear watermarks keyed by (user_id, archived source)"""
+    conn = connect()
+    try:
+        rows = conn.execute('SELECT user_id, table_name, max_id FROM clear_watermarks').fetchall()
+    finally:
+        conn.close()
+    return {(user_id, CLEARS[table]): max_id for user_id, table, max_id in rows if table in CLEARS}
+
+
+def archive_old_rows(connect, archive, source, max_age_days, batch_size=500, pause=0.01):
+    """Move every row of `source` older than `max_age_days` into the archive"""
+    conn = connect()
+    try:
+        cutoff = conn.execute("SELECT datetime('now', ?)", (f'-{max_age_days} days',)).fetchone()[0]
+    finally:
+        conn.close()
+    total = 0
+    after = 0
+    while True:
+        conn = archive.attach(connect())
+        try:
+            moved, after, more = archive_batch(conn, source, cutoff, after, batch_size)
+        finally:
+            conn.close()
+        total += moved
+        if not more:
+            return total
+        time.sleep(pause)
+
+
+class RetentionWorker:
+    """Periodic archive-and-compact pass on a background thread"""
+
+    def __init__(self, connect, archive, max_age_days=0, interval=3600, batch_size=500,
+                 vacuum_step=1000, pause=0.01, db_path=None):
+        self.connect = connect
+        self.archive = archive
+        self.max_age_days = max_age_days
+        self.interval = interval
+        self.batch_size = batch_size
+        self.vacuum_step = vacuum_step
+        self.pause = pause
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._worker = None
+        self.stats = {'runs': 0, 'archived': Counter(), 'segments_merged': 0, 'pages_vacuumed': 0,
+                      'last_run': None, 'last_duration': None}
+
+    def start(self):
+        if not self.interval:
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='mindlab-retention', daemon=True)
+                self._worker.start()
+
+    def run_once(self):
+        """Archive old rows (if a retention age is set), compact the archive, vacuum both databases"""
+        start = time.perf_counter()
+        archived = Counter()
+        merged = 0
+        if self.max_age_days > 0:
+            for source in SOURCES:
+                archived[source] = archive_old_rows(self.connect, self.archive, source, self.max_age_days,
+                                                    batch_size=self.batch_size, pause=self.pause)
+            merged = self.archive.compact(clear_watermarks(self.connect))
+        pages = incremental_vacuum(self.connect, self.vacuum_step, self.pause)
+        if self.archive.exists():
+            pages += incremental_vacuum(self.archive.connect, self.vacuum_step, self.pause)
+        with self._lock:
+            self.stats['runs'] += 1
+            self.stats['archived'].update(archived)
+            self.stats['segments_merged'] += merged
+            self.stats['pages_vacuumed'] += pages
+            self.stats['last_run'] = time.time()
+            self.stats['last_duration'] = time.perf_counter() - start
+        return {'archived': dict(archived), 'segments_merged': merged, 'pages_vacuumed': pages}
+
+    def _run(self):
+        while True:
+            try:
+                result = self.run_once()
+                if any(result['archived'].values()):
+                    print(f"✓ Retention archived {result['archived']}, freed {result['pages_vacuumed']} pages")
+            except Exception as e:
+                print(f"⚠ Warning: retention pass failed: {e}")
+            time.sleep(self.interval)
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['archived'] = dict(stats['archived'])
+        stats['max_age_days'] = self.max_age_days
+        if self.db_path and os.path.exists(self.db_path):
+            stats['db_bytes'] = os.path.getsize(self.db_path)
+        if self.archive.exists():
+            stats['archive_bytes'] = os.path.getsize(self.archive.path)
+        stats['archive'] = self.archive.stats()
+        return stats
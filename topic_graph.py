@@ -0,0 +1,121 @@
+"""Topic co-occurrence graph mined from study sessions.
+
+Whenever a learner saves a concept within ``session_gap`` seconds of their
+previous one, the edge previous -> new gets one more vote. Edges live in the
+``topic_edges`` adjacency table next to the rest of the app data and are
+updated in the same transaction as the concept insert, so the graph never
+needs a batch job to stay current.
+
+``(src, weight DESC)`` is covered by an index, which makes a top-k
+next-topics query a single index seek that reads k rows, no matter how many
+concepts have been recorded.
+
+Topics are keyed by their normalized name, with curated aliases folded into
+the curated topic ("cells" and "Cell Structure" share a node).
+"""
+from collections import Counter
+
+from deletion import not_cleared
+from fallback_content import library, normalize_topic
+
+SESSION_GAP = 6 * 60 * 60  # seconds between two concepts of the same study session
+
+
+def init_schema(cursor):
+    # Serves the per-user "previous topic" lookup (and the dashboard listing)
+    cursor.execute('''CREATE INDEX IF NOT EXISTS idx_concepts_user_created
+                      ON concepts (user_id, created_at)''')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS topic_edges
+                      (src TEXT NOT NULL,
+                       dst TEXT NOT NULL,
+                       dst_name TEXT NOT NULL,
+                       weight INTEGER NOT NULL DEFAULT 0,
+                       PRIMARY KEY (src, dst)) WITHOUT ROWID''')
+    cursor.execute('''CREATE INDEX IF NOT EXISTS idx_topic_edges_top
+                      ON topic_edges (src, weight DESC, dst, dst_name)''')
+
+
+def topic_key(topic):
+    """Graph node key for a topic"""
+    record = library.lookup(topic)
+    return normalize_topic(record['topic'] if record else topic)
+
+
+def display_name(topic):
+    record = library.lookup(topic)
+    return record['topic'] if record else topic.strip()
+
+
+def previous_topic(conn, user_id, session_gap=SESSION_GAP):
+    """The user's last saved, not cleared topic if it belongs to the current study session"""
+    row = conn.execute(f'''SELECT topic FROM concepts
+                           WHERE user_id = ? AND created_at >= datetime('now', ?)
+                             AND {not_cleared('concepts')}
+                           ORDER BY created_at DESC, id DESC LIMIT 1''',
+                       (user_id, f'-{int(session_gap)} seconds', user_id)).fetchone()
+    return row[0] if row else None
+
+
+def record_transition(conn, previous, topic, weight=1):
+    """Add `weight` to the edge previous -> topic (caller commits)"""
+    src, dst = topic_key(previous), topic_key(topic)
+    if not src or not dst or src == dst:
+        return False
+    conn.execute('''INSERT INTO topic_edges (src, dst, dst_name, weight) VALUES (?, ?, ?, ?)
+                    ON CONFLICT (src, dst) DO UPDATE SET weight = weight + excluded.weight,
+                                                        dst_name = excluded.dst_name''',
+                 (src, dst, display_name(topic), weight))
+    return True
+
+
+def rebuild(conn, session_gap=SESSION_GAP):
+    """Recompute every edge from the concepts table; returns the number of edges"""
+    rows = conn.execute('''SELECT prev_topic, topic FROM
+                           (SELECT topic, created_at,
+                                   LAG(topic) OVER (PARTITION BY user_id ORDER BY id) AS prev_topic,
+                                   LAG(created_at) OVER (PARTITION BY user_id ORDER BY id) AS prev_at
+                            FROM concepts)
+                           WHERE prev_topic IS NOT NULL
+                             AND (julianday(created_at) - julianday(prev_at)) * 86400 <= ?''',
+                        (session_gap,))
+    nodes = {}
+    names = {}
+    weights = Counter()
+    for previous, topic in rows:
+        for raw in (previous, topic):
+            if raw not in nodes:
+                nodes[raw] = (topic_key(raw), display_name(raw))
+        src, dst = nodes[previous][0], nodes[topic][0]
+        if src and dst and src != dst:
+            weights[src, dst] += 1
+            names[dst] = nodes[topic][1]
+
+    conn.execute('DELETE FROM topic_edges')
+    conn.executemany('INSERT INTO topic_edges (src, dst, dst_name, weight) VALUES (?, ?, ?, ?)',
+                     ((src, dst, names[dst], weight) for (src, dst), weight in weights.items()))
+    conn.commit()
+    return len(weights)
+
+
+def next_topics(conn, topic, k=5):
+    """Top-k topics learners study after `topic`, most frequent first"""
+    rows = conn.execute('''SELECT dst_name, weight FROM topic_edges
+                           WHERE src = ? ORDER BY weight DESC LIMIT ?''',
+                        (topic_key(topic), k)).fetchall()
+    return [{'topic': name, 'weight': weight} for name, weight in rows]
+
+
+def recommend(conn, recent_topics, k=5, exclude=()):
+    """Merge next topics of a learner's recent topics, skipping ones already studied"""
+    seen = {topic_key(topic) for topic in list(recent_topics) + list(exclude)}
+    scores = Counter()
+    names = {}
+    # Most recent topics count more
+    for rank, topic in enumerate(recent_topics):
+        for edge in next_topics(conn, topic, k * 2):
+            key = topic_key(edge['topic'])
+            if key in seen:
+                continue
+            scores[key] += edge['weight'] / (rank + 1)
+            names.setdefault(key, edge['topic'])
+    return [{'topic': names[key], 'score': round(score, 2)} for key, score in scores.most_common(k)]